@@ -1,22 +1,7 @@
 import streamlit as st
-import pandas as pd
-import os
-
-def seperateByRace(file, target, name, race):
-    """Separates Data by Race"""
-    racer = file[file["race.demographic"].str.contains(race, case=False, na=False)]
-    output_file_path = os.path.join(target, f"{name}.csv")
-    racer.to_csv(output_file_path, index=False)
-    return output_file_path
-
-def matchingDNA(race, counts, target, name):
-    """Matches Sample ID from phenotypes to counts"""
-    phenotypeData = pd.read_csv(race)
-    colA1 = phenotypeData.iloc[:, 0]
-    newFile = counts[['Ensembl_ID'] + [col for col in colA1 if col in counts.columns[1:]]]
-    output_file_path = os.path.join(target, f"{name}.csv")
-    newFile.to_csv(output_file_path, index=False)
-    return output_file_path
+from utils.ingest import read_upload
+from utils.segregation import partition_by_race, stream_partition_by_race
+from utils.workspace import get_workspace
 
 # Streamlit App Configuration
 st.set_page_config(
@@ -52,47 +37,49 @@ if phenotype_file and counts_file:
         races, 
         help="Select the racial demographics you want to segregate and analyze"
     )
+    stream_counts = st.checkbox(
+        "Stream counts file in chunks",
+        help="Reads only the selected samples' columns a block of rows at a time, for matrices too large to load whole"
+    )
 
     if selected_races:
         try:
             # Existing processing logic remains the same
-            os.makedirs("temp", exist_ok=True)
-            phenotype_path = os.path.join("temp", phenotype_file.name)
-            counts_path = os.path.join("temp", counts_file.name)
-
-            with open(phenotype_path, "wb") as f:
-                f.write(phenotype_file.read())  
-            with open(counts_path, "wb") as f:
-                f.write(counts_file.read())
-
-            phenotype_data = pd.read_csv(phenotype_path)
-            counts_data = pd.read_csv(counts_path)
-
-            os.makedirs("temp", exist_ok=True)
+            phenotype_data = read_upload(phenotype_file)
+
+            outputs = {}
+            if stream_counts:
+                # Streamed outputs go to this session's own quota-bound workspace
+                workspace = get_workspace()
+                output_paths = stream_partition_by_race(phenotype_data, counts_file, selected_races, workspace.directory)
+                workspace.claim(output_paths.values())
+                for race, output_path in output_paths.items():
+                    with open(output_path, "rb") as file:
+                        outputs[race] = file.read()
+            else:
+                # Resolve every selected race against the counts columns at once
+                counts_data = read_upload(counts_file)
+                for race, matched in partition_by_race(phenotype_data, counts_data, selected_races).items():
+                    outputs[race] = matched.to_csv(index=False).encode()
 
             # Create a container to display processing results
             results_container = st.container()
 
             with results_container:
                 st.markdown("### 🔍 Processing Results")
-                for race in selected_races:
-                    # Existing race processing logic
-                    race_file_path = seperateByRace(phenotype_data, "temp", race, race)
-                    output_file_path = matchingDNA(race_file_path, counts_data, "temp", f"matched_{race}")
-                    
+                for race, output_data in outputs.items():
                     # Improved result display
                     col1, col2 = st.columns([3, 1])
                     with col1:
                         st.success(f"Processed Race: {race}")
                     with col2:
-                        with open(output_file_path, "rb") as file:
-                            st.download_button(
-                                label="Download", 
-                                data=file, 
-                                file_name=f"matched_{race}.csv", 
-                                mime="text/csv",
-                                key=f"download_{race}"
-                            )
+                        st.download_button(
+                            label="Download", 
+                            data=output_data, 
+                            file_name=f"matched_{race}.csv", 
+                            mime="text/csv",
+                            key=f"download_{race}"
+                        )
 
         except Exception as e:
             st.error(f"An error occurred: {e}")
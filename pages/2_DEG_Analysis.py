@@ -1,12 +1,52 @@
-import streamlit as st
 import pandas as pd
-from pydeseq2.dds import DeseqDataSet
-from pydeseq2.ds import DeseqStats
-import numpy as np
+import streamlit as st
+from utils.cache import content_hash
+from utils.deg import (
+    BATCH_KINDS, SCREENING_TESTS, DEGIndex, batch_comparisons, combine_deg_results, create_metadata, deg_cache,
+    deg_key, initiate_deg, prefilter_counts, run_deg_batch, screen_deg, screen_key, size_factors,
+    smallest_group_size
+)
+from utils.ingest import read_upload, upload_digest
+from utils.jobs import follow, submit
 
 # Advanced Styling
 st.set_page_config(page_title="Gene Expression Analysis", layout="wide")
 
+# Results indexed once per fit, so cutoff changes resolve by binary search instead of rescanning every gene
+@st.cache_resource(max_entries=16)
+def deg_index(key, _results_df):
+    return DEGIndex(_results_df)
+
+
+# Everything below depends only on the upload and the pre-filter settings, identified by source, so it is
+# computed once per combination and cutoff changes never rehash or rescan the full count matrix
+@st.cache_resource(max_entries=4)
+def prepared_counts(source, _raw_data):
+    data, removed = prefilter_counts(_raw_data, *source[1:])
+    return data, removed, create_metadata(data)
+
+
+@st.cache_data(max_entries=64)
+def fit_key(source, test, _data, _metadata):
+    return deg_key(_data, _metadata) if test is None else screen_key(_data, _metadata, test)
+
+
+@st.cache_resource(max_entries=4)
+def cohort_size_factors(source, _data):
+    return size_factors(_data)
+
+
+@st.cache_resource(max_entries=4)
+def comparisons_for(source, phenotype_source, group_column, groups, batch_kind, reference, _data, _phenotype):
+    return batch_comparisons(_data, _phenotype, group_column, list(groups), batch_kind, reference)
+
+
+def show_results(label, results_df):
+    """Full result tables can run to 60k rows, so they are only sent to the browser on request"""
+    if st.checkbox(f"Show all {len(results_df)} rows of the {label}", key=f"show_{label}"):
+        st.write(label, results_df)
+
+
 # App Title
 st.title("Differential Gene Expression Analysis with PyDESeq2")
 
@@ -15,46 +55,72 @@ st.header("Input Files")
 racial_dataset = st.file_uploader("Upload Data (.csv OR .xlsx)", type=["csv", "xlsx"])
 
 if racial_dataset:
+    raw_data = read_upload(racial_dataset)
+
+    # Genes too sparse to ever pass the cutoffs can be dropped before any fitting, which shortens DESeq2 in
+    # proportion; off by default, as fewer genes also changes the padj correction
+    st.header("Pre-filtering")
+    min_count = st.number_input("Minimum Count (0 to disable, 10 is typical)", min_value=0, value=0)
+    min_samples = st.number_input("In at Least This Many Samples", min_value=0,
+                                  value=smallest_group_size(raw_data.columns.drop("Ensembl_ID")))
+    expression_quantile = st.slider("Drop Genes Below This Quantile of Mean CPM", min_value=0.0, max_value=0.9,
+                                    value=0.0, step=0.05)
+
     st.write("Processing dataset....")
-    if racial_dataset.name.endswith(".csv"):
-        data = pd.read_csv(racial_dataset)
-    elif racial_dataset.name.endswith(".xlsx"):
-        data = pd.read_excel(racial_dataset, engine="openpyxl")
-        data = pd.read_excel(racial_dataset, engine="openpyxl")
-    data = data.set_index("Ensembl_ID")
-    data = data.fillna(0)
-    data = data.round().astype(np.int32)
-    data = data[data.sum(axis=1) > 0]
-    data = data.T
+    source = (upload_digest(racial_dataset), min_count, min_samples, expression_quantile)
+    data, removed, metadata = prepared_counts(source, raw_data)
+    st.write(f"Pre-filtering removed {sum(removed.values())} of {sum(removed.values()) + data.shape[1]} genes", removed)
 
     st.write("Preprocessed Counts Data")
     st.dataframe(data.head(5))
 
-    # Create Metadata
-    def create_metadata(counts_data):
-        conditions = ['cancer' if '-01' in sample else 'normal' for sample in counts_data.index]
-        metadata = pd.DataFrame({'Ensembl_ID': counts_data.index, 'Condition': conditions})
-        metadata = metadata.set_index('Ensembl_ID')
-        return metadata
-
-    metadata = create_metadata(data)
     st.write("Metadata")
     st.dataframe(metadata)
 
-    def initiate_deg(counts_data, metadata):
-        dds = DeseqDataSet(
-            counts=counts_data,
-            metadata=metadata,
-            design_factors="Condition",
-            n_cpus=-1
-        )
-        dds.deseq2()
-        stat_res = DeseqStats(dds, contrast=("Condition", "cancer", "normal"))
-        stat_res.summary()
-        return stat_res.results_df
-
-    deg_stats_results = initiate_deg(data, metadata)
-    st.write("DEG Statistics Results", deg_stats_results)
+    # Fast screening gives a rough view in seconds; its candidates can then be refitted with DESeq2 below.
+    # Batch mode fits several subsets or contrasts of a combined matrix in one job.
+    analysis_mode = st.radio("Analysis Mode", options=["Full DESeq2", "Fast screening", "Batch (several subsets)"])
+    screening = analysis_mode == "Fast screening"
+    batch = analysis_mode == "Batch (several subsets)"
+
+    # A cached fit is used directly; otherwise the analysis runs in a background job the page follows
+    if batch:
+        phenotype_file = st.file_uploader("Upload Phenotype Data (.csv OR .xlsx)", type=["csv", "xlsx"],
+                                          key="batch_phenotype")
+        if not phenotype_file:
+            st.warning("Please upload the phenotype data to group samples by.")
+            st.stop()
+        phenotype = read_upload(phenotype_file)
+        group_column = st.selectbox("Group Samples By", options=phenotype.columns[1:])
+        groups = st.multiselect("Groups", options=phenotype[group_column].dropna().unique().tolist())
+        batch_kind = BATCH_KINDS[st.selectbox("Comparisons", options=list(BATCH_KINDS))]
+        reference = st.selectbox("Reference Group", options=groups) if batch_kind == "between" else None
+
+        comparisons, skipped = comparisons_for(source, upload_digest(phenotype_file), group_column, tuple(groups),
+                                               batch_kind, reference, data, phenotype)
+        if skipped:
+            st.warning(f"Skipped for lack of samples on both sides: {', '.join(skipped)}")
+        if not comparisons:
+            st.warning("Select groups with samples on both sides of a comparison.")
+            st.stop()
+        key = content_hash("batch", source, phenotype, group_column, groups, batch_kind, reference)
+        batch_job = submit("deg_batch", key, run_deg_batch, data, comparisons)
+        batch_results = follow("deg_batch", batch_job, "Batch DESeq2")
+    elif screening:
+        screening_test = SCREENING_TESTS[st.selectbox("Screening Test (on log-CPM)", options=list(SCREENING_TESTS))]
+        key = fit_key(source, screening_test, data, metadata)
+        deg_stats_results = deg_cache.load_frame(key)
+        if deg_stats_results is None:
+            screen_job = submit("screen", key, screen_deg, data, metadata, screening_test)
+            deg_stats_results = follow("screen", screen_job, "Screening")
+        show_results("Screening Results", deg_stats_results)
+    else:
+        key = fit_key(source, None, data, metadata)
+        deg_stats_results = deg_cache.load_frame(key)
+        if deg_stats_results is None:
+            deg_job = submit("deg", key, initiate_deg, data, metadata)
+            deg_stats_results = follow("deg", deg_job, "DESeq2")
+        show_results("DEG Statistics Results", deg_stats_results)
 
     # Filter DEG Results
     st.header("DEG Filtering Options")
@@ -62,14 +128,43 @@ if racial_dataset:
     cutoff_log2FoldChange = st.number_input("Cutoff for log2FoldChange", value=0.0)
     cutoff_baseMean = st.number_input("Cutoff for baseMean", value=10)
 
-    def filter_deg_results(deg_results):
-        deg_results = deg_results[deg_results['padj'] < cutoff_padj]
-        deg_results = deg_results[deg_results['log2FoldChange'].abs() > cutoff_log2FoldChange]
-        deg_results = deg_results[deg_results['baseMean'] >= cutoff_baseMean]
-        return deg_results
+    if batch:
+        # Every comparison shares the cutoffs; one tab each, then the tables side by side
+        indexes = {name: deg_index((key, name), results_df) for name, results_df in batch_results.items()}
+        filtered_batch = {
+            name: index.filter(cutoff_padj, cutoff_log2FoldChange, cutoff_baseMean) for name, index in indexes.items()
+        }
+        for tab, (name, filtered_deg_results) in zip(st.tabs(list(filtered_batch)), filtered_batch.items()):
+            with tab:
+                show_results(f"DEG Statistics Results for {name}", batch_results[name])
+                st.plotly_chart(indexes[name].volcano(cutoff_padj, cutoff_log2FoldChange, cutoff_baseMean),
+                                use_container_width=True, key=f"volcano_{name}")
+                st.write("Filtered DEG Results", filtered_deg_results)
+                st.write("DEG Genes", filtered_deg_results.index.to_list())
+        st.write("DEG Genes per Comparison", pd.Series({name: len(df) for name, df in filtered_batch.items()}))
+        st.write("log2FoldChange and padj by Comparison", combine_deg_results(batch_results))
+    else:
+        index = deg_index(key, deg_stats_results)
+        st.plotly_chart(index.volcano(cutoff_padj, cutoff_log2FoldChange, cutoff_baseMean), use_container_width=True)
+        filtered_deg_results = index.filter(cutoff_padj, cutoff_log2FoldChange, cutoff_baseMean)
+        st.write("Filtered DEG Results", filtered_deg_results)
+
+        if screening and not filtered_deg_results.empty and st.checkbox("Refit the candidate genes with DESeq2"):
+            # Size factors come from every gene so normalisation doesn't depend on which candidates passed
+            candidates = data[filtered_deg_results.index]
+            factors = cohort_size_factors(source, data)
+            key = deg_key(candidates, metadata, size_factors=factors)
+            deg_stats_results = deg_cache.load_frame(key)
+            if deg_stats_results is None:
+                deg_job = submit("deg", key, initiate_deg, candidates, metadata, size_factors=factors)
+                deg_stats_results = follow("deg", deg_job, "DESeq2")
+            show_results("DEG Statistics Results for the Candidate Genes", deg_stats_results)
 
-    filtered_deg_results = filter_deg_results(deg_stats_results)
-    st.write("Filtered DEG Results", filtered_deg_results)
+            index = deg_index(key, deg_stats_results)
+            st.plotly_chart(index.volcano(cutoff_padj, cutoff_log2FoldChange, cutoff_baseMean),
+                            use_container_width=True, key="volcano_candidates")
+            filtered_deg_results = index.filter(cutoff_padj, cutoff_log2FoldChange, cutoff_baseMean)
+            st.write("Filtered DEG Results", filtered_deg_results)
 
-    # Display DEG Genes
-    st.write("DEG Genes", filtered_deg_results.index.to_list())
\ No newline at end of file
+        # Display DEG Genes
+        st.write("DEG Genes", filtered_deg_results.index.to_list())
@@ -1,9 +1,14 @@
+import io
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from sklearn.preprocessing import label_binarize
-from sklearn.metrics import roc_curve, auc
+from utils.cache import content_hash
+from utils.ingest import read_genes, read_upload
+from utils.jobs import follow, submit
+from utils.roc import (
+    CI_METHODS, MAX_CURVE_POINTS, auc_confidence_intervals, label_samples, positive_labels, roc_curves, roc_figure,
+    roc_table
+)
 
 # Page configuration
 st.set_page_config(
@@ -38,12 +43,13 @@ auc_threshold = st.slider("", min_value=0.5, max_value=1.0, value=0.9, step=0.05
 
 if upregulated_genes_file and big_dataset:
     # Load data
-    data = pd.read_csv(upregulated_genes_file)
+    genes_df = read_upload(upregulated_genes_file)
+    data = genes_df
     geneID = data.iloc[:,0]
     features_df = data.iloc[:,1:]
     data = data.set_index("Ensembl_ID")
     data = data.T
-    data['label'] = ['cancer' if '-01' in sample else 'normal' for sample in data.index]
+    data['label'] = label_samples(data.index)
     
     # Sample count information
     st.markdown("""
@@ -56,65 +62,74 @@ if upregulated_genes_file and big_dataset:
     st.write(f"Total normal samples: {class_counts['normal']}")
     st.write(f"Total samples: {len(data)}")
     
-    # Prepare data for ROC
+    # Prepare data for ROC, with cancer as the positive class as in the pipeline
     X = np.asarray(features_df.T)
-    y = np.asarray(data['label'])
-    
-    y_bin = label_binarize(y, classes=np.unique(y))
-    
-    fpr = dict()
-    tpr = dict()
-    roc_auc = dict()
+    y_bin = positive_labels(features_df.columns)
+
+    # Score every gene at once with the pipeline's roc_table, cached so slider moves skip the ranking
+    @st.cache_data
+    def score_genes(genes_df):
+        return roc_table(genes_df)['ROC'].to_numpy()
+
+    auc_values = score_genes(genes_df)
+    roc_auc = dict(enumerate(auc_values))
 
-    for i in range(X.shape[1]):
-        fpr[i], tpr[i], _ = roc_curve(y_bin.ravel(), X[:, i].ravel())
-        roc_auc[i] = auc(fpr[i], tpr[i])
-    
-    # Create ROC DataFrame
-    roc_df = pd.DataFrame({
-        'Ensembl_ID': geneID,
-        'ROC': [roc_auc[i] for i in range(len(geneID))]
-    })
-    
     # Plot ROC Curve
     st.markdown("""
         <h2 style='color: #57b1ff; padding: 1rem 0;'>
             📈 ROC Curve
         </h2>
         """, unsafe_allow_html=True)
-    plt.figure(figsize=(10, 8))
-    
-    high_auc_genes = []
-    for i in range(len(geneID)):
-        if roc_auc[i] > auc_threshold:
-            plt.plot(fpr[i], tpr[i], lw=2, label=f'Gene {geneID[i]} (AUC = {roc_auc[i]:.4f})')
-            high_auc_genes.append(geneID[i])
-    
-    plt.plot([0, 1], [0, 1], 'k--', lw=2)
-    plt.xlim([0.0, 1.0])
-    plt.ylim([0.0, 1.05])
-    plt.xlabel('False Positive Rate')
-    plt.ylabel('True Positive Rate')
-    plt.title('ROC Curve for Genes with AUC > 0.9')
-    plt.legend(loc="lower right")
-    plt.show()
-
-    roc_df = pd.DataFrame({
-        'Ensembl_ID': geneID,
-        'ROC': [roc_auc[i] for i in range(X.shape[1])]
-    })
-
-    for i in range(X.shape[1]):
-        if roc_auc[i] > 0.9:
-            print(f"AUC for gene {geneID[i]}: {roc_auc[i]:.4f}")
-    
+    # Curves are drawn only for the top genes by AUC and any picked by hand
+    top_n = st.number_input("Plot the Top N Genes by AUC", min_value=1, value=20)
+    pinned_genes = st.multiselect("Always Plot These Genes", options=geneID)
+    gene_positions = {gene: i for i, gene in enumerate(geneID)}
+    pinned = [gene_positions[gene] for gene in pinned_genes]
+    plotted = list(dict.fromkeys([*map(int, np.argsort(-auc_values, kind="stable")[:top_n]), *pinned]))
+
+    # Simplified curves are kept per dataset and only missing ones computed, so moving the AUC slider just
+    # changes which traces are visible
+    @st.cache_resource(max_entries=8)
+    def curve_store(digest):
+        return {}
+
+    curves = curve_store(content_hash(X, y_bin))
+    missing = [i for i in plotted if i not in curves]
+    if missing:
+        fpr, tpr = roc_curves(X, y_bin, missing, MAX_CURVE_POINTS)
+        curves.update({i: (fpr[i], tpr[i]) for i in missing})
+    st.plotly_chart(roc_figure({i: curves[i] for i in plotted}, roc_auc, geneID, auc_threshold, pinned),
+                    use_container_width=True)
+
+    # Optional confidence intervals for every gene, so borderline AUCs can be held to their lower bound
+    st.markdown("""
+        <h2 style='color: #57b1ff; padding: 1rem 0;'>
+            📏 AUC Confidence Intervals
+        </h2>
+        """, unsafe_allow_html=True)
+    use_lower_bound = False
+    if st.checkbox("Compute AUC confidence intervals"):
+        ci_method = CI_METHODS[st.selectbox("Interval Method", options=list(CI_METHODS))]
+        n_bootstraps = st.number_input("Bootstrap Replicates", min_value=100, max_value=10000, value=1000, step=100,
+                                       disabled=ci_method != "bootstrap")
+        confidence = st.slider("Confidence Level", min_value=0.8, max_value=0.99, value=0.95, step=0.01)
+        key = content_hash(X, y_bin, ci_method, n_bootstraps, confidence)
+        ci_job = submit("auc_ci", key, auc_confidence_intervals, X, y_bin, ci_method, n_bootstraps, confidence)
+        ci_lower, ci_upper = follow("auc_ci", ci_job, "AUC confidence intervals")
+        ci_df = pd.DataFrame({'Ensembl_ID': geneID, 'ROC': auc_values, 'CI Lower': ci_lower, 'CI Upper': ci_upper})
+        st.dataframe(ci_df.sort_values('CI Lower', ascending=False), hide_index=True)
+        use_lower_bound = st.checkbox("Require lower CI bound > threshold")
+
+    selection_scores = ci_lower if use_lower_bound else auc_values
+    high_auc_genes = [geneID[i] for i in range(len(geneID)) if selection_scores[i] > auc_threshold]
+
     # Display high AUC genes
     st.markdown("""
         <h2 style='color: #57b1ff; padding: 1rem 0;'>
             🎯 High AUC Genes
         </h2>
         """, unsafe_allow_html=True)
-    st.write(f"Genes with AUC > {auc_threshold}:")
+    st.write(f"Genes with {'lower CI bound' if use_lower_bound else 'AUC'} > {auc_threshold}:")
     st.write(high_auc_genes)
     
     # Filter Combined Dataset
@@ -123,23 +138,24 @@ if upregulated_genes_file and big_dataset:
             📑 Filtered Dataset
         </h2>
         """, unsafe_allow_html=True)
-    big_dataset_df = pd.read_csv(big_dataset)
-    regulated_genes = big_dataset_df[big_dataset_df['Ensembl_ID'].isin(high_auc_genes)]
+    # Only the selected genes' rows are read, through the combined dataset's gene index
+    regulated_genes = read_genes(big_dataset, high_auc_genes)
     st.dataframe(regulated_genes)
 
     # Download option
     @st.cache_data
-    def convert_to_excel(df, file_path):
-        with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
+    def convert_to_excel(df):
+        buffer = io.BytesIO()
+        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
             df.to_excel(writer, index=False, sheet_name='ROC_Results')
-        return file_path
+        return buffer.getvalue()
 
-    # Save DataFrame to a temporary path
-    file_path = convert_to_excel(regulated_genes, "ROC_Results.xlsx")
+    # Serve the workbook from memory so sessions never share a file on disk
+    excel_data = convert_to_excel(regulated_genes)
 
     st.download_button(
         label="Download ROC_Results as XLSX",
-        data=open(file_path, "rb").read(),
+        data=excel_data,
         file_name="ROC_Results.xlsx",
         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
     )
\ No newline at end of file
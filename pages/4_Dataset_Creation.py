@@ -1,5 +1,7 @@
 import streamlit as st
 import pandas as pd
+from utils.genesets import GeneSets, build_datasets, gene_column, list_names, parse_definitions
+from utils.ingest import read_upload
 
 # Page configuration
 st.set_page_config(
@@ -26,9 +28,9 @@ col1, col2 = st.columns(2)
 with col1:
     st.markdown("""
         <div class='upload-section'>
-        <h4 style='color: #57b1ff;'>DEG Genes File</h4>
+        <h4 style='color: #57b1ff;'>Gene List Files</h4>
         """, unsafe_allow_html=True)
-    deg_file = st.file_uploader("", type=['csv'], key="deg")
+    gene_files = st.file_uploader("", type=['csv', 'xlsx'], key="deg", accept_multiple_files=True)
     st.markdown("</div>", unsafe_allow_html=True)
 
 with col2:
@@ -40,44 +42,69 @@ with col2:
     st.markdown("</div>", unsafe_allow_html=True)
 
 
-if deg_file and dataset_file:
+if gene_files and dataset_file:
     # Read Files
-    ensembl_id = pd.read_csv(deg_file)
-    dataset = pd.read_csv(dataset_file)
+    names = list_names([gene_file.name for gene_file in gene_files])
+    gene_sets = GeneSets({name: gene_column(read_upload(gene_file)) for name, gene_file in zip(names, gene_files)})
 
-    # Get Ensembl IDs
-    ensembl_ids = ensembl_id['Ensembl_ID']
-    
-    # Display First Few Ensembl IDs
+    # Display the Gene Lists
     st.markdown("""
         <h2 style='color: #57b1ff; margin-top: 2rem;'>
-            🧬 Gene File Ensembl IDs
+            🧬 Gene Lists
         </h2>
         """, unsafe_allow_html=True)
     with st.container():
         st.markdown("<div class='dataframe-container'>", unsafe_allow_html=True)
-        st.dataframe(ensembl_ids, use_container_width=True)
+        st.dataframe(pd.DataFrame({
+            'List': names,
+            'File': [gene_file.name for gene_file in gene_files],
+            'Genes': [int(gene_sets.masks[name].sum()) for name in names],
+        }), hide_index=True, use_container_width=True)
         st.markdown("</div>", unsafe_allow_html=True)
 
-    # Filter Dataset
-    regulated_genes = dataset[dataset['Ensembl_ID'].isin(ensembl_ids)]
-    regulated_genes = regulated_genes.set_index('Ensembl_ID')
+    # Dataset Definitions
+    st.markdown("""
+        <h2 style='color: #57b1ff; margin-top: 2rem;'>
+            🧮 Dataset Definitions
+        </h2>
+        """, unsafe_allow_html=True)
+    definitions_text = st.text_area(
+        "One dataset per line as name = expression",
+        value=f"Dataset = {' | '.join(names)}",
+        help="Combine the list names above with & (intersection), | (union), - (difference), ^ (symmetric "
+             "difference) and parentheses, e.g. Both = (white_DEG | black_DEG) & roc_passed"
+    )
+    try:
+        definitions = parse_definitions(definitions_text)
+        masks = {name: gene_sets.evaluate(expression) for name, expression in definitions.items()}
+    except ValueError as error:
+        st.error(str(error))
+        st.stop()
+    if not masks:
+        st.warning("Define at least one dataset.")
+        st.stop()
 
-    # Display Filtered Genes
+    # Every dataset comes out of a single read of the combined dataset's rows
+    datasets = build_datasets(dataset_file, gene_sets, masks)
+
+    # Display the Created Datasets
     st.markdown("""
         <h2 style='color: #57b1ff; margin-top: 2rem;'>
-            📊 Created Counts Dataset
+            📊 Created Counts Datasets
         </h2>
         """, unsafe_allow_html=True)
-    with st.container():
-        st.markdown("<div class='dataframe-container'>", unsafe_allow_html=True)
-        st.dataframe(regulated_genes, use_container_width=True)
-        st.markdown("</div>", unsafe_allow_html=True)
+    for tab, (name, regulated_genes) in zip(st.tabs(list(datasets)), datasets.items()):
+        with tab:
+            st.write(f"{masks[name].sum()} genes selected, {len(regulated_genes)} rows found in the combined dataset")
+            st.markdown("<div class='dataframe-container'>", unsafe_allow_html=True)
+            st.dataframe(regulated_genes, use_container_width=True)
+            st.markdown("</div>", unsafe_allow_html=True)
 
-    # Save Option
-    st.download_button(
-        label="Download Filtered Genes",
-        data=regulated_genes.to_csv(index=True),
-        file_name='Dataset.csv',
-        mime='text/csv'
-    )
\ No newline at end of file
+            # Save Option
+            st.download_button(
+                label=f"Download {name}",
+                data=regulated_genes.to_csv(index=True),
+                file_name=f'{name}.csv',
+                mime='text/csv',
+                key=f"download_{name}"
+            )
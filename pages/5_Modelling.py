@@ -0,0 +1,118 @@
+import io
+import streamlit as st
+import pandas as pd
+from sklearn.model_selection import train_test_split
+from utils.cache import content_hash
+from utils.ingest import read_upload
+from utils.jobs import follow, submit
+from utils.modelling import (
+    ESTIMATORS, SEARCH_STRATEGIES, TRANSFORMS, benchmark_transforms, make_transform, prepare_dataset, run_models
+)
+
+# App Title
+st.title("Modelling with Balancing and Hyperparameters")
+
+# Upload dataset
+uploaded_file = st.file_uploader("Upload your dataset (.csv or .xlsx)", type=["csv", "xlsx"])
+
+if uploaded_file:
+    # Load dataset
+    data = read_upload(uploaded_file)
+
+    st.write("Uploaded Dataset", data)
+
+    # Select index column
+    index_col = st.selectbox("Select Index Column", options=data.columns)
+    X, y, data = prepare_dataset(data, index_col)
+
+    # Display class distribution
+    st.write("Class Distribution", data['label'].value_counts())
+    
+    st.write("X dataframe")
+    st.dataframe(X)
+
+    st.write("y dataframe")
+    st.dataframe(y)
+
+    # Data splitting options
+    test_size = st.slider("Test Set Size (%)", min_value=10, max_value=50, value=40, step=1) / 100
+    stratify_option = st.checkbox("Stratify Split", value=True)
+
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=test_size, random_state=42, stratify=y if stratify_option else None
+    )
+
+    st.write("Training Set Size:", len(X_train))
+    st.write("Test Set Size:", len(X_test))
+
+    # Estimators to train; several are compared side by side and share the resampled training sets
+    selected_estimators = st.multiselect("Select Estimators", options=list(ESTIMATORS), default=["SVM"])
+
+    # Balancing methods selection
+    selected_balancing_methods = st.multiselect(
+        "Select Balancing Methods",
+        options=[
+            'RandomOverSampler', 'SVMSMOTE', 'SMOTEENN', 'SMOTETomek',
+            'ADASYN', 'BorderlineSMOTE', 'KMeansSMOTE', 'No Balancing',
+        ],
+        default=["No Balancing"]
+    )
+
+    # Global configuration for sampling
+    sampling_strategy = st.slider(
+        "Sampling Strategy (proportion of the minority class)", 
+        min_value=0.1, max_value=1.0, value=0.3, step=0.1
+    )
+    random_state = st.number_input("Random State", min_value=0, value=42)
+
+    # Raw counts span several orders of magnitude; rescaling them lets the solvers converge in far fewer iterations
+    preprocessing = TRANSFORMS[st.selectbox("Preprocessing (fitted on each training fold)", options=list(TRANSFORMS))]
+
+    # Hyperparameter tuning
+    use_hyperparameter_tuning = st.radio("Use Hyperparameter Tuning?", options=['Yes', 'No'], index=1)
+    search_strategy, n_candidates, time_budget = 'grid', None, None
+    if use_hyperparameter_tuning == "Yes":
+        search_strategy = SEARCH_STRATEGIES[st.selectbox("Search Strategy", options=list(SEARCH_STRATEGIES))]
+        if search_strategy in ('random', 'bayesian'):
+            n_candidates = st.number_input("Fit Budget (candidates per model)", min_value=1, value=20)
+        if search_strategy != 'grid':
+            # 0 means no limit; otherwise the best model found when time runs out is kept
+            time_budget = st.number_input("Time Budget per Model (seconds, 0 for none)", min_value=0, value=0) or None
+
+    # Train every estimator and balancing method in a background job that survives reruns and can be cancelled
+    job_args = (X_train, X_test, y_train, y_test, selected_balancing_methods, selected_estimators)
+    job_kwargs = dict(sampling_strategy=sampling_strategy, random_state=random_state, tune=use_hyperparameter_tuning == "Yes",
+                      search=search_strategy, n_candidates=n_candidates, time_budget=time_budget,
+                      transform=make_transform(preprocessing))
+    models_job = submit("Modelling", content_hash(*job_args, job_kwargs), run_models, *job_args, **job_kwargs)
+    results_df = follow("Modelling", models_job, "Training")
+
+    # Display results
+    st.write("Results", results_df)
+
+    # Download option
+    @st.cache_data
+    def convert_to_excel(df):
+        buffer = io.BytesIO()
+        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+            df.to_excel(writer, index=False, sheet_name='results')
+        return buffer.getvalue()
+
+    # Serve the workbook from memory so sessions never share a file on disk
+    excel_data = convert_to_excel(results_df)
+
+    st.download_button(
+        label="Download Results as XLSX",
+        data=excel_data,
+        file_name="results.xlsx",
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    )
+
+    # Compare each estimator's default fit on raw counts against every preprocessing option
+    if st.checkbox("Benchmark preprocessing options"):
+        benchmark_args = (X_train, y_train, selected_estimators)
+        benchmark_job = submit("Preprocessing benchmark", content_hash(*benchmark_args), benchmark_transforms,
+                               *benchmark_args)
+        st.write("Preprocessing Benchmark", follow("Preprocessing benchmark", benchmark_job, "Benchmarking"))
+else:
+    st.warning("Please upload a dataset to proceed.")
\ No newline at end of file
@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# Keep the disk caches the modules create on import out of the working tree
+os.environ.setdefault("OFSCD_CACHE_DIR", tempfile.mkdtemp(prefix="ofscd-test-cache-"))
@@ -0,0 +1,35 @@
+import os
+
+import numpy as np
+
+import utils.cache
+from utils.cache import DiskCache, content_hash
+
+
+def test_object_arrays_hash_by_value():
+    labels = ["cancer", "normal", "cancer"]
+    # Built at runtime so the strings are distinct objects, not interned constants
+    rebuilt = np.array(["".join(label) for label in labels], dtype=object)
+
+    assert content_hash(np.array(labels, dtype=object)) == content_hash(rebuilt)
+    assert content_hash(np.array(labels, dtype=object)) != content_hash(np.array(["normal", "cancer", "cancer"], dtype=object))
+
+
+def test_evict_skips_entries_removed_by_another_process(tmp_path, monkeypatch):
+    cache = DiskCache("evict-race", max_bytes=10)
+    cache.directory = str(tmp_path)
+    for name in ("a", "b", "c"):
+        (tmp_path / f"{name}.bin").write_bytes(b"x" * 8)
+
+    scandir = os.scandir
+
+    def scandir_then_remove(path):
+        # Another process deletes an entry between the directory listing and its stat
+        entries = list(scandir(path))
+        os.remove(entries[0].path)
+        return iter(entries)
+
+    monkeypatch.setattr(utils.cache.os, "scandir", scandir_then_remove)
+    cache.evict()
+
+    assert sum(entry.stat().st_size for entry in tmp_path.iterdir()) <= 10
@@ -0,0 +1,63 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+from statsmodels.stats.multitest import multipletests
+
+from utils.deg import DEGIndex, create_metadata, filter_deg_results, screen_deg
+
+
+def _results(n_genes=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    results = pd.DataFrame({
+        'baseMean': rng.gamma(0.5, 200, n_genes),
+        'log2FoldChange': rng.normal(0, 2, n_genes),
+        'padj': rng.random(n_genes) ** 3,
+    }, index=[f"ENSG{i:011d}" for i in range(n_genes)])
+    # DESeq2 leaves padj NaN for filtered genes and some ties are common
+    results.iloc[::17, 2] = np.nan
+    results.iloc[::5, 1] = 1.0
+    return results
+
+
+@pytest.mark.parametrize("cutoffs", [
+    (0.05, 0.0, 10), (0.01, 1.0, 0), (1.0, 0.5, 100), (0.0, 0.0, 0), (0.5, 1.0, 1e9), (np.inf, -1.0, -np.inf),
+])
+def test_deg_index_filter_matches_filter_deg_results(cutoffs):
+    results = _results()
+
+    pd.testing.assert_frame_equal(DEGIndex(results).filter(*cutoffs), filter_deg_results(results, *cutoffs))
+
+
+@pytest.mark.parametrize("cutoff_padj", [0.0, 0.05])
+def test_volcano_draws_the_padj_line_only_for_a_positive_cutoff(cutoff_padj):
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", RuntimeWarning)
+        figure = DEGIndex(_results()).volcano(cutoff_padj, 1.0, 0)
+
+    assert len(figure.layout.shapes) == (3 if cutoff_padj > 0 else 2)
+
+
+def _counts(n_samples=40, n_genes=300, seed=0):
+    rng = np.random.default_rng(seed)
+    samples = [f"TCGA-AA-{i:04d}-{'01A' if i % 2 else '11A'}" for i in range(n_samples)]
+    means = rng.gamma(1.0, 50, n_genes)
+    fold = np.where(rng.random(n_genes) < 0.2, 4.0, 1.0)
+    cancer = np.array(['-01' in sample for sample in samples])
+    counts = rng.poisson(means * np.where(cancer[:, None], fold, 1.0))
+    return pd.DataFrame(counts, index=samples, columns=[f"ENSG{i:011d}" for i in range(n_genes)])
+
+
+def test_screen_deg_welch_pvalues_are_bh_adjusted():
+    counts = _counts()
+    results = screen_deg(counts, create_metadata(counts), test="welch", n_jobs=1)
+
+    # Same Welch test on the same log-CPM, then Benjamini-Hochberg
+    library_sizes = counts.sum(axis=1).to_numpy(dtype=np.float64)
+    log_cpm = np.log2((counts.to_numpy(dtype=np.float64) + 0.5) / (library_sizes[:, None] + 1.0) * 1e6)
+    cancer = create_metadata(counts)['Condition'].to_numpy() == 'cancer'
+    expected_p = stats.ttest_ind(log_cpm[cancer], log_cpm[~cancer], equal_var=False).pvalue
+    np.testing.assert_allclose(results['pvalue'], expected_p, rtol=1e-9)
+    np.testing.assert_allclose(results['padj'], multipletests(expected_p, method='fdr_bh')[1], rtol=1e-9)
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from utils.genesets import GeneSets, list_names, parse_definitions
+
+GENE_LISTS = {
+    "A": ["g1", "g2", "g3", "g4"],
+    "B": ["g3", "g4", "g5", "g5"],
+    "C": ["g4", "g6"],
+}
+
+
+def _selected(gene_sets, expression):
+    return set(gene_sets.genes[gene_sets.evaluate(expression)])
+
+
+@pytest.mark.parametrize("expression, expected", [
+    ("A & B", {"g3", "g4"}),
+    ("A | C", {"g1", "g2", "g3", "g4", "g6"}),
+    ("A - B", {"g1", "g2"}),
+    ("A ^ B", {"g1", "g2", "g5"}),
+    # - binds tighter than &, & tighter than ^, ^ tighter than |
+    ("A | B & C", {"g1", "g2", "g3", "g4"}),
+    ("(A | B) & C", {"g4"}),
+    ("A & B - C", {"g3"}),
+    ("A ^ B | C", {"g1", "g2", "g4", "g5", "g6"}),
+    ("A ^ (B | C)", {"g1", "g2", "g5", "g6"}),
+])
+def test_evaluate_matches_python_set_operators(expression, expected):
+    gene_sets = GeneSets(GENE_LISTS)
+    sets = {name: set(genes) for name, genes in GENE_LISTS.items()}
+
+    assert _selected(gene_sets, expression) == expected == eval(expression, {}, sets)
+
+
+@pytest.mark.parametrize("expression", [
+    "A + B", "A and B", "~A", "A.genes", "__import__('os')", "f(A)", "A[0]", "A & 'g1'", "lambda: A", "D", "A &",
+])
+def test_evaluate_rejects_anything_but_set_operators_on_known_lists(expression):
+    with pytest.raises(ValueError):
+        GeneSets(GENE_LISTS).evaluate(expression)
+
+
+def test_masks_cover_each_list_once():
+    gene_sets = GeneSets(GENE_LISTS)
+
+    assert list(gene_sets.genes) == ["g1", "g2", "g3", "g4", "g5", "g6"]
+    np.testing.assert_array_equal(gene_sets.masks["B"], [False, False, True, True, True, False])
+
+
+def test_list_names_are_distinct_identifiers():
+    assert list_names(["up genes.csv", "up-genes.xlsx", "1st.csv", "class.csv"]) == [
+        "up_genes", "up_genes_2", "_1st", "_class",
+    ]
+
+
+def test_parse_definitions_requires_name_and_expression():
+    assert parse_definitions("shared = A & B\n\n only_a = A - B ") == {"shared": "A & B", "only_a": "A - B"}
+    with pytest.raises(ValueError):
+        parse_definitions("A & B")
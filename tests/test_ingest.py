@@ -0,0 +1,63 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.ingest import read_genes, read_upload
+
+
+class Upload(io.BytesIO):
+    """Stands in for Streamlit's UploadedFile"""
+
+    def __init__(self, data, name, file_id):
+        super().__init__(data)
+        self.name = name
+        self.file_id = file_id
+
+
+def _upload(df, file_id):
+    return Upload(df.to_csv(index=False).encode(), f"{file_id}.csv", file_id)
+
+
+def _genes_by_samples(seed=0):
+    rng = np.random.default_rng(seed)
+    ids = [f"ENSG{i:011d}" for i in rng.permutation(500)]
+    # A duplicated ID must come back on every row it occupies
+    ids[7] = ids[300] = ids[450]
+    df = pd.DataFrame(rng.integers(0, 1000, (500, 6)), columns=[f"TCGA-AA-{i:04d}-01A" for i in range(6)])
+    df.insert(0, "Ensembl_ID", ids)
+    return df
+
+
+@pytest.mark.parametrize("wanted", [
+    ["ENSG00000000003", "ENSG00000000499", "ENSG00000000250"],
+    ["ENSG00000000003", "ENSG00000000003", "ENSG_MISSING"],
+    [],
+])
+def test_read_genes_matches_an_isin_filter_of_read_upload(wanted):
+    df = _genes_by_samples()
+    wanted = wanted + [df.loc[450, "Ensembl_ID"]]
+    upload = _upload(df, "read-genes")
+
+    full = read_upload(upload)
+    pd.testing.assert_frame_equal(read_genes(upload, wanted), full[full["Ensembl_ID"].isin(wanted)])
+
+
+def test_read_genes_falls_back_for_uploads_arrow_cannot_hold():
+    df = _genes_by_samples(1)
+    # Mixed numbers and text in one column don't fit a single Arrow type
+    df["notes"] = [1, "a"] * 250
+    upload = Upload(b"", "mixed.xlsx", "mixed")
+    df.to_excel(upload, index=False)
+    wanted = list(df["Ensembl_ID"][:10])
+
+    full = read_upload(upload)
+    pd.testing.assert_frame_equal(read_genes(upload, wanted), full[full["Ensembl_ID"].isin(wanted)])
+
+
+def test_read_upload_builds_the_frame_once_per_distinct_upload():
+    df = _genes_by_samples(2)
+
+    # A fresh upload object with the same bytes, as on a rerun or in another session
+    assert read_upload(_upload(df, "first")) is read_upload(_upload(df, "second"))
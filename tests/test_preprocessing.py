@@ -0,0 +1,25 @@
+import numpy as np
+
+from utils.preprocessing import CountTransformer
+
+
+def test_vst_matches_deseq2_mean_fit_formula():
+    counts = np.array([[10, 100, 5], [20, 200, 15], [30, 50, 25], [40, 80, 35]], dtype=float)
+    transformer = CountTransformer('vst').fit(counts)
+
+    # Normalized count and dispersion worked through by hand for the first cell
+    q = transformer._normalize(counts)[0, 0]
+    a = transformer.dispersion_
+    expected = np.log2((1 + 2 * a * q + 2 * np.sqrt(a * q * (1 + a * q))) / (4 * a))
+
+    assert np.isclose(transformer.transform(counts)[0, 0], expected, rtol=1e-5)
+
+
+def test_vst_hand_computed_value():
+    transformer = CountTransformer('vst')
+    transformer.n_features_in_ = 1
+    transformer.dispersion_ = 0.1
+    transformer._normalize = lambda X: np.asarray(X, dtype=np.float64)
+
+    # a = 0.1, q = 10: log2((1 + 2 + 2 * sqrt(2)) / 0.4) = log2(14.5711) = 3.8650
+    assert np.isclose(transformer.transform(np.array([[10.0]]))[0, 0], 3.86504, atol=1e-4)
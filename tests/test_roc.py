@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import norm
+from sklearn.metrics import auc, roc_curve
+
+from utils.pipeline import DEFAULTS
+from utils.roc import CI_METHODS, MAX_CURVE_POINTS, auc_confidence_intervals, batch_auc, roc_table, simplify_curve
+
+
+def test_roc_table_scores_cancer_upregulated_genes_high():
+    samples = [f"TCGA-AA-{i:04d}-01A" for i in range(6)] + [f"TCGA-AA-{i:04d}-11A" for i in range(6, 10)]
+    cancer = np.array(['-01' in sample for sample in samples])
+    rng = np.random.default_rng(0)
+    up = np.where(cancer, 100, 10) + rng.integers(0, 5, len(samples))
+    noise = rng.integers(0, 50, len(samples))
+    genes_df = pd.DataFrame([["ENSG_UP", *up], ["ENSG_NOISE", *noise]], columns=["Ensembl_ID", *samples])
+
+    table = roc_table(genes_df)
+
+    assert table.loc[0, "ROC"] == 1.0
+    assert table.loc[0, "ROC"] > DEFAULTS["roc"]["auc_threshold"]
+    assert 0.0 <= table.loc[1, "ROC"] <= 1.0
+
+
+def _per_gene_auc(X, y_bin):
+    # The loop batch_auc replaced: one roc_curve and auc call per gene
+    return np.array([auc(*roc_curve(y_bin, X[:, i])[:2]) for i in range(X.shape[1])])
+
+
+@pytest.mark.parametrize("tied", [False, True])
+def test_batch_auc_matches_per_gene_roc_curve(tied):
+    rng = np.random.default_rng(1)
+    y_bin = (rng.random(80) < 0.6).astype(int)
+    X = rng.normal(size=(80, 50)) + y_bin[:, None] * rng.uniform(0, 2, 50)
+    if tied:
+        X = np.round(X)
+
+    np.testing.assert_allclose(batch_auc(X, y_bin), _per_gene_auc(X, y_bin), atol=1e-12)
+
+
+@pytest.mark.parametrize("tied", [False, True])
+def test_simplify_curve_keeps_the_ends_and_the_area(tied):
+    rng = np.random.default_rng(2)
+    y_bin = (rng.random(5000) < 0.5).astype(int)
+    scores = rng.normal(size=5000) + y_bin
+    if tied:
+        scores = np.round(scores, 1)
+    fpr, tpr, _ = roc_curve(y_bin, scores)
+
+    simple_fpr, simple_tpr = simplify_curve(fpr, tpr, MAX_CURVE_POINTS)
+
+    assert len(simple_fpr) <= MAX_CURVE_POINTS
+    assert (simple_fpr[0], simple_tpr[0]) == (fpr[0], tpr[0])
+    assert (simple_fpr[-1], simple_tpr[-1]) == (fpr[-1], tpr[-1])
+    # Every kept vertex is one of sklearn's
+    assert set(zip(simple_fpr, simple_tpr)) <= set(zip(fpr, tpr))
+    assert abs(auc(simple_fpr, simple_tpr) - auc(fpr, tpr)) < 1e-3
+
+
+@pytest.mark.parametrize("tied", [False, True])
+@pytest.mark.parametrize("method", list(CI_METHODS.values()))
+def test_confidence_intervals_cover_the_point_auc(method, tied):
+    rng = np.random.default_rng(3)
+    y_bin = (rng.random(60) < 0.5).astype(int)
+    X = rng.normal(size=(60, 40)) + y_bin[:, None] * rng.uniform(0, 2, 40)
+    if tied:
+        X = np.round(X)
+
+    lower, upper = auc_confidence_intervals(X, y_bin, method=method, n_bootstraps=200, n_jobs=1)
+
+    point = batch_auc(X, y_bin)
+    assert lower.shape == upper.shape == (40,)
+    assert np.all((0 <= lower) & (lower <= point + 1e-12) & (point <= upper + 1e-12) & (upper <= 1))
+
+
+def test_delong_intervals_match_the_pairwise_definition():
+    rng = np.random.default_rng(4)
+    y_bin = (rng.random(50) < 0.4).astype(int)
+    X = np.round(rng.normal(size=(50, 5)) + y_bin[:, None], 1)
+    lower, upper = auc_confidence_intervals(X, y_bin, method="delong", n_jobs=1)
+
+    # Structural components from the Mann-Whitney kernel over every positive/negative pair
+    for gene in range(X.shape[1]):
+        positives, negatives = X[y_bin == 1, gene], X[y_bin == 0, gene]
+        kernel = (positives[:, None] > negatives[None, :]) + 0.5 * (positives[:, None] == negatives[None, :])
+        variance = kernel.mean(axis=1).var(ddof=1) / len(positives) + kernel.mean(axis=0).var(ddof=1) / len(negatives)
+        half_width = norm.ppf(0.975) * np.sqrt(variance)
+        np.testing.assert_allclose([lower[gene], upper[gene]],
+                                   np.clip([kernel.mean() - half_width, kernel.mean() + half_width], 0, 1))
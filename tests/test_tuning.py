@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+from sklearn.datasets import make_classification
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import GridSearchCV
+from sklearn.naive_bayes import GaussianNB
+from sklearn.svm import SVC
+
+from utils.modelling import ESTIMATORS, build_pipeline, make_search
+from utils.tuning import PrecomputedKernelSearchCV, VarSmoothingSearchCV, WarmStartPathSearchCV
+
+
+@pytest.mark.parametrize("method_name", ["SVMSMOTE", "BorderlineSMOTE", "ADASYN", "SMOTEENN"])
+def test_halving_samples_search_survives_a_small_minority_class(method_name):
+    # About 12% minority, so the first halving round's stratified share is only a handful of rows
+    X, y = make_classification(n_samples=400, n_features=20, weights=[0.88], random_state=0)
+    pipeline = build_pipeline('Logistic Regression', method_name)
+    search = make_search('Logistic Regression', pipeline, search='halving_samples', n_jobs=1)
+
+    search.fit(X, y)
+
+    assert np.isfinite(search.best_score_)
+    assert search.cv_results_["iter"].max() > 0
+
+
+def _assert_same_search(search, grid_search):
+    assert search.best_params_ == grid_search.best_params_
+    for name in ("mean_test_score", "std_test_score", "rank_test_score"):
+        np.testing.assert_allclose(search.cv_results_[name], grid_search.cv_results_[name], atol=1e-12)
+    for fold in range(grid_search.n_splits_):
+        np.testing.assert_allclose(search.cv_results_[f"split{fold}_test_score"],
+                                   grid_search.cv_results_[f"split{fold}_test_score"], atol=1e-12)
+
+
+def test_precomputed_kernel_search_matches_grid_search():
+    X, y = make_classification(n_samples=120, n_features=10, random_state=0)
+    param_grid = {'kernel': ['linear', 'rbf'], 'C': [0.1, 1, 10], 'gamma': ['scale', 0.01],
+                  'class_weight': [None, 'balanced']}
+
+    search = PrecomputedKernelSearchCV(SVC(), param_grid, cv=5).fit(X, y)
+    grid_search = GridSearchCV(SVC(), param_grid, cv=5, scoring='accuracy').fit(X, y)
+
+    _assert_same_search(search, grid_search)
+
+
+def test_var_smoothing_search_matches_grid_search():
+    X, y = make_classification(n_samples=150, n_features=20, random_state=1)
+    param_grid = {'var_smoothing': np.logspace(0, -9, num=10)}
+
+    search = VarSmoothingSearchCV(GaussianNB(), param_grid, cv=5).fit(X, y)
+    grid_search = GridSearchCV(GaussianNB(), param_grid, cv=5, scoring='accuracy').fit(X, y)
+
+    _assert_same_search(search, grid_search)
+
+
+def test_warm_start_path_search_picks_grid_search_best_params():
+    X, y = make_classification(n_samples=300, n_features=30, random_state=1)
+    param_grid = ESTIMATORS['Logistic Regression']['param_grid']
+
+    search = WarmStartPathSearchCV(LogisticRegression(), param_grid, cv=5).fit(X, y)
+    grid_search = GridSearchCV(LogisticRegression(), param_grid, cv=5, scoring='accuracy').fit(X, y)
+
+    assert search.best_params_ == grid_search.best_params_
+    assert search.best_score_ == pytest.approx(grid_search.best_score_)
+
+
+def test_warm_start_path_search_rejects_other_scorers():
+    X, y = make_classification(n_samples=60, random_state=0)
+    with pytest.raises(ValueError):
+        WarmStartPathSearchCV(LogisticRegression(), {'C': [1.0]}, scoring='f1').fit(X, y)
@@ -0,0 +1,102 @@
+import hashlib
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+
+CACHE_ROOT = os.environ.get("OFSCD_CACHE_DIR", ".cache")
+
+
+def content_hash(*objs):
+    """Returns a sha256 digest over the contents of frames, arrays and plain values"""
+    h = hashlib.sha256()
+    for obj in objs:
+        if isinstance(obj, pd.DataFrame):
+            h.update(repr(list(obj.columns)).encode())
+            h.update(pd.util.hash_pandas_object(obj, index=True).values.tobytes())
+        elif isinstance(obj, pd.Series):
+            h.update(repr(obj.name).encode())
+            h.update(pd.util.hash_pandas_object(obj, index=True).values.tobytes())
+        elif isinstance(obj, np.ndarray):
+            h.update(f"{obj.dtype}{obj.shape}".encode())
+            if obj.dtype == object:
+                # The raw bytes of an object array are pointers, so hash the values instead
+                h.update(pd.util.hash_array(obj.ravel()).tobytes())
+            else:
+                h.update(np.ascontiguousarray(obj).tobytes())
+        elif isinstance(obj, (bytes, bytearray, memoryview)):
+            h.update(obj)
+        else:
+            h.update(repr(obj).encode())
+        # Separator so ("ab", "c") and ("a", "bc") hash differently
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class DiskCache:
+    """Content-addressed file cache with least-recently-used eviction under a size cap"""
+
+    def __init__(self, name, max_bytes):
+        self.directory = os.path.join(CACHE_ROOT, name)
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, key, suffix):
+        return os.path.join(self.directory, f"{key}{suffix}")
+
+    def get(self, key, suffix):
+        """Returns the cached file path for key, or None on a miss"""
+        path = self.path(key, suffix)
+        try:
+            # Touch the entry so eviction sees it as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, suffix, write):
+        """Stores an entry by calling write(tmp_path) and returns its final path"""
+        path = self.path(key, suffix)
+        tmp_path = os.path.join(self.directory, f".{uuid.uuid4().hex}{suffix}")
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.evict(keep={path})
+        return path
+
+    def load_frame(self, key):
+        """Reads a cached DataFrame, or returns None on a miss"""
+        path = self.get(key, ".pkl")
+        if path is None:
+            return None
+        return pd.read_pickle(path)
+
+    def save_frame(self, key, df):
+        return self.put(key, ".pkl", df.to_pickle)
+
+    def evict(self, keep=()):
+        """Deletes the least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.startswith("."):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    # Another process evicted it since the directory was listed
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path in keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
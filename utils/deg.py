@@ -0,0 +1,434 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from joblib import Parallel, delayed, effective_n_jobs
+from pydeseq2.dds import DeseqDataSet
+from pydeseq2.ds import DeseqStats
+from pydeseq2.preprocessing import deseq2_norm_fit, deseq2_norm_transform
+from scipy import stats
+
+from utils.cache import DiskCache, content_hash
+
+# Fitted DESeq2 results survive reruns and restarts, bounded to a few hundred MB on disk
+deg_cache = DiskCache("deseq2", max_bytes=512 * 1024 ** 2)
+
+
+# Samples converted per block while preprocessing, so the upload is never copied whole
+PREPROCESS_CHUNK_SAMPLES = 64
+
+
+def prefilter_counts(data, min_count=0, min_samples=0, expression_quantile=0.0):
+    """Turns a genes x samples upload into the samples x genes int32 matrix DESeq2 expects, dropping genes
+    that could never pass the DEG cutoffs
+
+    Genes with no counts are always dropped. With min_count, a gene must reach it in at least min_samples
+    samples; with expression_quantile, its mean CPM must reach that quantile of the remaining genes.
+    Returns the counts and the number of genes each rule removed.
+    """
+    samples = [column for column in data.columns if column != "Ensembl_ID"]
+    counts = np.empty((len(data), len(samples)), dtype=np.int32)
+    totals = np.zeros(len(data), dtype=np.int64)
+    passing = np.zeros(len(data), dtype=np.int64)
+    cpm_sums = np.zeros(len(data))
+    # Blocks of samples are filled, rounded and narrowed in place, accumulating the per-gene statistics
+    for start in range(0, len(samples), PREPROCESS_CHUNK_SAMPLES):
+        block = data[samples[start:start + PREPROCESS_CHUNK_SAMPLES]].to_numpy(dtype=np.float64)
+        np.nan_to_num(block, copy=False, nan=0.0)
+        np.rint(block, out=block)
+        counts[:, start:start + block.shape[1]] = block
+        totals += counts[:, start:start + block.shape[1]].sum(axis=1)
+        if min_count:
+            passing += (block >= min_count).sum(axis=1)
+        if expression_quantile:
+            library_sizes = block.sum(axis=0)
+            library_sizes[library_sizes == 0] = 1.0
+            cpm_sums += (block / library_sizes * 1e6).sum(axis=1)
+
+    keep = totals > 0
+    removed = {"No counts": int((~keep).sum())}
+    if min_count:
+        enough = passing >= min_samples
+        removed[f"Fewer than {min_samples} samples with {min_count}+ counts"] = int((keep & ~enough).sum())
+        keep &= enough
+    if expression_quantile and keep.any():
+        mean_cpm = cpm_sums / max(len(samples), 1)
+        expressed = mean_cpm >= np.quantile(mean_cpm[keep], expression_quantile)
+        removed[f"Mean CPM below the {expression_quantile:.0%} quantile"] = int((keep & ~expressed).sum())
+        keep &= expressed
+
+    genes = pd.Index(data["Ensembl_ID"], name="Ensembl_ID")[keep]
+    # Only the kept genes are copied; the transpose is a view
+    return pd.DataFrame(counts[keep].T, index=pd.Index(samples), columns=genes), removed
+
+
+def preprocess_counts(data):
+    """Turns a genes x samples upload into the samples x genes integer matrix DESeq2 expects"""
+    return prefilter_counts(data)[0]
+
+
+def smallest_group_size(samples):
+    """Size of the smaller of the cancer and normal groups, DESeq2's suggested minimum sample count"""
+    cancer = sum('-01' in sample for sample in samples)
+    return min(cancer, len(samples) - cancer)
+
+
+def create_metadata(counts_data):
+    conditions = ['cancer' if '-01' in sample else 'normal' for sample in counts_data.index]
+    metadata = pd.DataFrame({'Ensembl_ID': counts_data.index, 'Condition': conditions})
+    metadata = metadata.set_index('Ensembl_ID')
+    return metadata
+
+
+# DeseqDataSet.deseq2() broken into its steps so long fits can report progress
+DESEQ2_STEPS = [
+    ("Fitting size factors", "fit_size_factors"),
+    ("Fitting genewise dispersions", "fit_genewise_dispersions"),
+    ("Fitting dispersion trend", "fit_dispersion_trend"),
+    ("Fitting dispersion prior", "fit_dispersion_prior"),
+    ("Fitting MAP dispersions", "fit_MAP_dispersions"),
+    ("Fitting log fold changes", "fit_LFC"),
+    ("Calculating Cook's distances", "calculate_cooks"),
+    ("Refitting outlier genes", "refit"),
+]
+
+
+# Per-gene tests offered by the fast screening mode
+SCREENING_TESTS = {
+    'Welch t-test': 'welch',
+    'Wilcoxon rank-sum': 'wilcoxon',
+}
+
+# Genes tested per pool task
+SCREEN_CHUNK_GENES = 2000
+
+# Volcano plots draw genes outside the cutoffs as one marker per cell of this many x this many
+VOLCANO_BINS = 150
+
+
+# Comparisons a batch DEG run can make between the groups of a phenotype column
+BATCH_KINDS = {
+    'Cancer vs normal within each group': 'within',
+    'Each group vs a reference group (cancer samples)': 'between',
+}
+
+
+def deg_key(counts_data, metadata, design_factors="Condition", size_factors=None, contrast=None):
+    return content_hash(counts_data, metadata, design_factors, size_factors, contrast)
+
+
+def size_factors(counts_data):
+    """Median-of-ratios size factors over every gene, as DESeq2 fits them; None when every gene has a zero"""
+    counts = counts_data.to_numpy(dtype=np.float64)
+    logmeans, filtered_genes = deseq2_norm_fit(counts)
+    if not filtered_genes.any():
+        return None
+    _, factors = deseq2_norm_transform(counts, logmeans, filtered_genes)
+    return factors
+
+
+def initiate_deg(counts_data, metadata, design_factors="Condition", progress=None, size_factors=None,
+                 contrast=None, n_cpus=-1):
+    """Fits DESeq2 and returns the cancer vs normal results, or those of contrast, reusing a cached fit when
+    the inputs match
+
+    Pass size_factors fitted on the whole cohort when counts_data holds only some of its genes or samples,
+    e.g. the candidates kept by screen_deg, so normalisation doesn't depend on which were kept.
+    """
+    key = deg_key(counts_data, metadata, design_factors, size_factors, contrast)
+    results_df = deg_cache.load_frame(key)
+    if results_df is not None:
+        return results_df
+
+    dds = DeseqDataSet(
+        counts=counts_data,
+        metadata=metadata,
+        design_factors=design_factors,
+        n_cpus=n_cpus
+    )
+    total = len(DESEQ2_STEPS) + 1
+    for done, (label, step) in enumerate(DESEQ2_STEPS):
+        if step == "refit" and not dds.refit_cooks:
+            continue
+        if progress is not None:
+            progress(done, total, label)
+        if step == "fit_size_factors" and size_factors is not None:
+            dds.obsm["size_factors"] = np.asarray(size_factors, dtype=np.float64)
+            dds.layers["normed_counts"] = dds.X / dds.obsm["size_factors"][:, None]
+            dds.varm["_normed_means"] = dds.layers["normed_counts"].mean(0)
+            continue
+        getattr(dds, step)()
+
+    if progress is not None:
+        progress(total - 1, total, "Running Wald tests")
+    stat_res = DeseqStats(dds, contrast=contrast or (design_factors, "cancer", "normal"))
+    stat_res.summary()
+    deg_cache.save_frame(key, stat_res.results_df)
+    return stat_res.results_df
+
+
+def batch_comparisons(counts_data, phenotype, column, groups, kind="within", reference=None):
+    """Builds the (name, samples, metadata, contrast) of each fit in a batch DEG run
+
+    Samples are matched to the phenotype's first column and grouped by its column. 'within' compares cancer
+    with normal samples inside each group; 'between' compares each group's cancer samples with the
+    reference group's. Comparisons without samples on both sides are skipped and returned by name.
+    """
+    sample_groups = pd.Series(phenotype[column].to_numpy(), index=phenotype.iloc[:, 0].to_numpy())
+    sample_groups = sample_groups[~sample_groups.index.duplicated()].reindex(counts_data.index)
+    conditions = create_metadata(counts_data)["Condition"]
+    comparisons, skipped = [], []
+    if kind == "within":
+        for group in groups:
+            samples = counts_data.index[(sample_groups == group).to_numpy()]
+            metadata = create_metadata(counts_data.loc[samples])
+            if metadata["Condition"].nunique() < 2:
+                skipped.append(str(group))
+                continue
+            comparisons.append((str(group), samples, metadata, None))
+    else:
+        cancer = (conditions == "cancer").to_numpy()
+        for group in groups:
+            if group == reference:
+                continue
+            name = f"{group} vs {reference}"
+            in_pair = sample_groups.isin([group, reference]).to_numpy() & cancer
+            samples = counts_data.index[in_pair]
+            metadata = pd.DataFrame({"Group": sample_groups[samples].astype(str).to_numpy()}, index=samples)
+            if metadata["Group"].nunique() < 2:
+                skipped.append(name)
+                continue
+            comparisons.append((name, samples, metadata, ("Group", str(group), str(reference))))
+    return comparisons, skipped
+
+
+def _fit_comparison(name, counts_data, metadata, factors, contrast, n_cpus):
+    """Pool task for one comparison of a batch run"""
+    design_factors = contrast[0] if contrast else "Condition"
+    return name, initiate_deg(counts_data, metadata, design_factors, size_factors=factors, contrast=contrast,
+                              n_cpus=n_cpus)
+
+
+def run_deg_batch(counts_data, comparisons, progress=None, log=print):
+    """Fits DESeq2 for every comparison of a combined matrix in one job and returns their results by name
+
+    Size factors are fitted once over every sample, so all comparisons share one normalisation. Fits not
+    already cached run side by side in worker processes, each with an equal share of the job's cores.
+    """
+    factors = size_factors(counts_data)
+    positions = pd.Series(np.arange(len(counts_data)), index=counts_data.index)
+    results, pending = {}, []
+    for name, samples, metadata, contrast in comparisons:
+        subset_factors = None if factors is None else factors[positions[samples].to_numpy()]
+        design_factors = contrast[0] if contrast else "Condition"
+        subset = counts_data.loc[samples]
+        cached = deg_cache.load_frame(deg_key(subset, metadata, design_factors, subset_factors, contrast))
+        if cached is not None:
+            results[name] = cached
+        else:
+            pending.append((name, subset, metadata, subset_factors, contrast))
+
+    total = len(comparisons)
+    if pending:
+        workers = min(len(pending), effective_n_jobs(-1))
+        n_cpus = max(1, effective_n_jobs(-1) // workers)
+        if progress is not None:
+            progress(len(results), total, f"Fitting {len(pending)} comparisons on {workers} workers")
+        fits = Parallel(n_jobs=workers, return_as="generator_unordered")(
+            delayed(_fit_comparison)(name, subset, metadata, factors, contrast, n_cpus)
+            for name, subset, metadata, factors, contrast in pending
+        )
+        for name, results_df in fits:
+            results[name] = results_df
+            log(f"{name}: {len(results_df)} genes tested")
+            if progress is not None:
+                progress(len(results), total, f"{len(results)}/{total} comparisons finished")
+    # Keep the order the comparisons were asked for
+    return {name: results[name] for name, *_ in comparisons}
+
+
+def combine_deg_results(results, columns=("log2FoldChange", "padj")):
+    """Puts each comparison's columns side by side, one row per gene, for comparing runs"""
+    return pd.concat({name: results_df[list(columns)] for name, results_df in results.items()}, axis=1)
+
+
+def screen_key(counts_data, metadata, test="welch", design_factors="Condition"):
+    return content_hash("screen", counts_data, metadata, design_factors, test)
+
+
+def _screen_chunk(counts, factors, library_sizes, cancer, start, stop, test):
+    """Tests one block of genes, computing its log-CPM on the fly so the full matrix is never materialised"""
+    chunk = np.asarray(counts[:, start:stop], dtype=np.float64)
+    base_mean = (chunk / factors[:, None]).mean(axis=0)
+    # limma-voom's log-CPM, with a half count offset so zeros stay finite
+    log_cpm = np.log2((chunk + 0.5) / (library_sizes[:, None] + 1.0) * 1e6)
+    tumour, normal = log_cpm[cancer], log_cpm[~cancer]
+    log2_fold_change = tumour.mean(axis=0) - normal.mean(axis=0)
+    if test == "wilcoxon":
+        stat, pvalue = stats.mannwhitneyu(tumour, normal, axis=0, method="asymptotic")
+        standard_error = np.full(stop - start, np.nan)
+    else:
+        var_tumour = tumour.var(axis=0, ddof=1) / len(tumour)
+        var_normal = normal.var(axis=0, ddof=1) / len(normal)
+        standard_error = np.sqrt(var_tumour + var_normal)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            stat = log2_fold_change / standard_error
+            # Welch-Satterthwaite degrees of freedom
+            dof = (var_tumour + var_normal) ** 2 / (
+                var_tumour ** 2 / (len(tumour) - 1) + var_normal ** 2 / (len(normal) - 1)
+            )
+        pvalue = 2 * stats.t.sf(np.abs(stat), dof)
+    return base_mean, log2_fold_change, standard_error, stat, pvalue
+
+
+def screen_deg(counts_data, metadata, test="welch", design_factors="Condition", progress=None, n_jobs=-1):
+    """Screens every gene for cancer vs normal differences with a per-gene test on log-CPM
+
+    Returns DESeq2's result columns in seconds rather than minutes: baseMean from size-factor normalised
+    counts, log2FoldChange as the difference in mean log-CPM and BH-adjusted padj. Gene blocks are tested
+    in parallel worker processes; the screen is cached like a DESeq2 fit.
+    """
+    key = screen_key(counts_data, metadata, test, design_factors)
+    results_df = deg_cache.load_frame(key)
+    if results_df is not None:
+        return results_df
+
+    counts = counts_data.to_numpy()
+    library_sizes = counts.sum(axis=1, dtype=np.float64)
+    factors = size_factors(counts_data)
+    if factors is None:
+        # No gene without zeros to take ratios against; fall back to relative library sizes
+        factors = library_sizes / np.exp(np.log(library_sizes).mean())
+    cancer = (metadata.loc[counts_data.index, design_factors] == "cancer").to_numpy()
+
+    bounds = [(start, min(start + SCREEN_CHUNK_GENES, counts.shape[1]))
+              for start in range(0, counts.shape[1], SCREEN_CHUNK_GENES)]
+    # The counts reach the workers as a read-only memory map rather than a pickled copy per task
+    chunks = Parallel(n_jobs=n_jobs, max_nbytes="1M", mmap_mode="r", return_as="generator")(
+        delayed(_screen_chunk)(counts, factors, library_sizes, cancer, start, stop, test) for start, stop in bounds
+    )
+    columns = []
+    for done, chunk in enumerate(chunks, start=1):
+        columns.append(chunk)
+        if progress is not None:
+            progress(done, len(bounds), f"Tested {bounds[done - 1][1]} of {counts.shape[1]} genes")
+
+    base_mean, log2_fold_change, standard_error, stat, pvalue = (np.concatenate(column) for column in zip(*columns))
+    padj = np.full_like(pvalue, np.nan)
+    tested = np.isfinite(pvalue)
+    padj[tested] = stats.false_discovery_control(pvalue[tested])
+    results_df = pd.DataFrame({
+        "baseMean": base_mean,
+        "log2FoldChange": log2_fold_change,
+        "lfcSE": standard_error,
+        "stat": stat,
+        "pvalue": pvalue,
+        "padj": padj,
+    }, index=counts_data.columns)
+    deg_cache.save_frame(key, results_df)
+    return results_df
+
+
+def filter_deg_results(deg_results, cutoff_padj, cutoff_log2FoldChange, cutoff_baseMean):
+    """Applies the cutoffs to cached DESeq2 results without refitting"""
+    mask = (
+        (deg_results['padj'] < cutoff_padj)
+        & (deg_results['log2FoldChange'].abs() > cutoff_log2FoldChange)
+        & (deg_results['baseMean'] >= cutoff_baseMean)
+    )
+    return deg_results[mask]
+
+
+class DEGIndex:
+    """DEG results sorted by padj, |log2FoldChange| and baseMean, so any cutoffs resolve by binary search
+
+    Each cutoff keeps one contiguous run of its sort order; only the shortest run is scanned for the other
+    two cutoffs. Selections match filter_deg_results.
+    """
+
+    def __init__(self, results_df):
+        self.results_df = results_df
+        self.log2_fold_change = results_df["log2FoldChange"].to_numpy(dtype=np.float64)
+        self.values = {
+            "padj": results_df["padj"].to_numpy(dtype=np.float64),
+            "abs_log2FoldChange": np.abs(self.log2_fold_change),
+            "baseMean": results_df["baseMean"].to_numpy(dtype=np.float64),
+        }
+        # argsort puts NaN last; counting the rest keeps NaN out of every run, as comparisons with NaN fail
+        self.orders = {name: np.argsort(values, kind="stable") for name, values in self.values.items()}
+        self.sorted = {name: values[self.orders[name]] for name, values in self.values.items()}
+        self.finite = {name: int(np.count_nonzero(~np.isnan(values))) for name, values in self.values.items()}
+
+        # Volcano coordinates and grid cells, fixed for the results so cutoff changes only regroup
+        with np.errstate(divide="ignore"):
+            self.neg_log10_padj = -np.log10(np.clip(self.values["padj"], 1e-300, None))
+        plotted = ~np.isnan(self.log2_fold_change) & ~np.isnan(self.neg_log10_padj)
+        self.cells = np.full(len(results_df), -1)
+        if plotted.any():
+            cells = []
+            for axis in (self.log2_fold_change[plotted], self.neg_log10_padj[plotted]):
+                span = max(axis.max() - axis.min(), 1e-12)
+                cells.append(np.minimum(((axis - axis.min()) / span * VOLCANO_BINS).astype(int), VOLCANO_BINS - 1))
+            self.cells[plotted] = cells[0] * VOLCANO_BINS + cells[1]
+
+    def select(self, cutoff_padj, cutoff_log2FoldChange, cutoff_baseMean):
+        """Positions of the genes passing all three cutoffs, in results order"""
+        runs = {
+            "padj": (0, np.searchsorted(self.sorted["padj"][:self.finite["padj"]], cutoff_padj, side="left")),
+            "abs_log2FoldChange": (
+                np.searchsorted(self.sorted["abs_log2FoldChange"][:self.finite["abs_log2FoldChange"]],
+                                cutoff_log2FoldChange, side="right"),
+                self.finite["abs_log2FoldChange"],
+            ),
+            "baseMean": (
+                np.searchsorted(self.sorted["baseMean"][:self.finite["baseMean"]], cutoff_baseMean, side="left"),
+                self.finite["baseMean"],
+            ),
+        }
+        name, (start, stop) = min(runs.items(), key=lambda item: item[1][1] - item[1][0])
+        candidates = self.orders[name][start:stop]
+        keep = (
+            (self.values["padj"][candidates] < cutoff_padj)
+            & (self.values["abs_log2FoldChange"][candidates] > cutoff_log2FoldChange)
+            & (self.values["baseMean"][candidates] >= cutoff_baseMean)
+        )
+        return np.sort(candidates[keep])
+
+    def filter(self, cutoff_padj, cutoff_log2FoldChange, cutoff_baseMean):
+        return self.results_df.iloc[self.select(cutoff_padj, cutoff_log2FoldChange, cutoff_baseMean)]
+
+    def volcano(self, cutoff_padj, cutoff_log2FoldChange, cutoff_baseMean):
+        """WebGL volcano plot: genes passing the cutoffs drawn individually, the rest aggregated by grid cell"""
+        selected = self.select(cutoff_padj, cutoff_log2FoldChange, cutoff_baseMean)
+        rest = np.ones(len(self.results_df), dtype=bool)
+        rest[selected] = False
+        rest &= self.cells >= 0
+        # One representative gene per occupied cell, labelled with how many genes it stands for
+        positions = np.flatnonzero(rest)
+        _, first, counts = np.unique(self.cells[positions], return_index=True, return_counts=True)
+        representatives = positions[first]
+
+        genes = self.results_df.index.astype(str).to_numpy()
+        figure = go.Figure()
+        figure.add_trace(go.Scattergl(
+            x=self.log2_fold_change[representatives], y=self.neg_log10_padj[representatives], mode="markers",
+            name=f"Not significant ({len(positions)})", marker={"color": "lightgrey", "size": 5},
+            customdata=counts, hovertemplate="%{customdata} gene(s) near here<extra></extra>",
+        ))
+        for label, side, color in (("Up", self.log2_fold_change[selected] > 0, "crimson"),
+                                   ("Down", self.log2_fold_change[selected] <= 0, "royalblue")):
+            genes_on_side = selected[side]
+            figure.add_trace(go.Scattergl(
+                x=self.log2_fold_change[genes_on_side], y=self.neg_log10_padj[genes_on_side], mode="markers",
+                name=f"{label} ({len(genes_on_side)})", marker={"color": color, "size": 6},
+                text=genes[genes_on_side],
+                hovertemplate="%{text}<br>log2FoldChange %{x:.3f}<br>-log10 padj %{y:.2f}<extra></extra>",
+            ))
+        # A padj cutoff of 0 sits at infinity on this axis
+        if cutoff_padj > 0:
+            figure.add_hline(y=-np.log10(cutoff_padj), line_dash="dash", line_color="grey")
+        if cutoff_log2FoldChange > 0:
+            for x in (-cutoff_log2FoldChange, cutoff_log2FoldChange):
+                figure.add_vline(x=x, line_dash="dash", line_color="grey")
+        figure.update_layout(xaxis_title="log2FoldChange", yaxis_title="-log10 padj", height=500,
+                             margin={"t": 30})
+        return figure
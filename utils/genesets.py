@@ -0,0 +1,91 @@
+import ast
+import keyword
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from utils.ingest import read_genes
+
+# Set operators allowed in dataset expressions, applied to boolean masks over the gene dictionary.
+# Python precedence holds: - binds tightest, then &, then ^, then |
+SET_OPERATORS = {
+    ast.BitAnd: np.logical_and,
+    ast.BitOr: np.logical_or,
+    ast.Sub: lambda left, right: left & ~right,
+    ast.BitXor: np.logical_xor,
+}
+
+
+def list_names(filenames):
+    """Turns uploaded file names into distinct identifiers usable in set expressions"""
+    names = []
+    for filename in filenames:
+        name = re.sub(r"\W+", "_", os.path.splitext(filename)[0]).strip("_") or "genes"
+        if name[0].isdigit() or keyword.iskeyword(name):
+            name = f"_{name}"
+        unique, suffix = name, 2
+        while unique in names:
+            unique, suffix = f"{name}_{suffix}", suffix + 1
+        names.append(unique)
+    return names
+
+
+def gene_column(df):
+    """Returns a gene list's Ensembl_IDs, taking the first column of bare panels without that header"""
+    genes = df["Ensembl_ID"] if "Ensembl_ID" in df.columns else df.iloc[:, 0]
+    return genes.dropna().astype(str)
+
+
+def parse_definitions(text):
+    """Reads one 'name = expression' line per dataset, skipping blank lines"""
+    definitions = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        name, _, expression = line.partition("=")
+        if not name.strip() or not expression.strip():
+            raise ValueError(f"Expected 'name = expression', got {line.strip()!r}")
+        definitions[name.strip()] = expression.strip()
+    return definitions
+
+
+class GeneSets:
+    """Gene lists encoded as integers against one shared gene dictionary, so set expressions run on boolean masks"""
+
+    def __init__(self, gene_lists):
+        # Every distinct gene gets one integer code, its position in self.genes
+        all_genes = np.concatenate([np.asarray(genes, dtype=object) for genes in gene_lists.values()])
+        self.genes = pd.Index(pd.unique(all_genes))
+        self.masks = {}
+        for name, genes in gene_lists.items():
+            mask = np.zeros(len(self.genes), dtype=bool)
+            mask[self.genes.get_indexer(pd.unique(np.asarray(genes, dtype=object)))] = True
+            self.masks[name] = mask
+
+    def evaluate(self, expression):
+        """Returns the mask over self.genes selected by an expression such as (A | B) & C - D"""
+        try:
+            tree = ast.parse(expression, mode="eval")
+        except SyntaxError as error:
+            raise ValueError(f"Could not parse {expression!r}") from error
+        return self._evaluate(tree.body)
+
+    def _evaluate(self, node):
+        if isinstance(node, ast.Name):
+            if node.id not in self.masks:
+                raise ValueError(f"Unknown gene list {node.id!r}; available lists: {', '.join(self.masks)}")
+            return self.masks[node.id]
+        if isinstance(node, ast.BinOp) and type(node.op) in SET_OPERATORS:
+            return SET_OPERATORS[type(node.op)](self._evaluate(node.left), self._evaluate(node.right))
+        raise ValueError("Expressions may only combine gene list names with &, |, -, ^ and parentheses")
+
+
+def build_datasets(combined_file, gene_sets, masks):
+    """Returns a frame per named mask, indexed by Ensembl_ID in file order, from one read of the combined dataset"""
+    selected = np.logical_or.reduce(list(masks.values()))
+    rows = read_genes(combined_file, gene_sets.genes[selected])
+    codes = gene_sets.genes.get_indexer(rows["Ensembl_ID"])
+    rows = rows.set_index("Ensembl_ID")
+    return {name: rows[mask[codes]] for name, mask in masks.items()}
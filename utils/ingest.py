@@ -0,0 +1,152 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import streamlit as st
+from pyarrow import feather
+
+from utils.cache import DiskCache
+
+# Parsed uploads are shared by every page and session, capped at a few GB on disk
+upload_cache = DiskCache("uploads", max_bytes=4 * 1024 ** 3)
+
+# Upload digests by Streamlit file id, so reruns don't rehash hundreds of MB
+_digests = {}
+
+# Gene indexes by cache path: Ensembl_IDs in sorted order and the row each one sits on
+_gene_indexes = {}
+
+
+def upload_digest(uploaded_file):
+    """Returns a sha256 digest of the upload's bytes"""
+    file_id = getattr(uploaded_file, "file_id", None)
+    if file_id is not None and file_id in _digests:
+        return _digests[file_id]
+    digest = hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+    if file_id is not None:
+        if len(_digests) > 256:
+            _digests.clear()
+        _digests[file_id] = digest
+    return digest
+
+
+def parse_upload(uploaded_file):
+    """Parses a raw CSV or Excel upload"""
+    uploaded_file.seek(0)
+    if uploaded_file.name.endswith(".xlsx"):
+        return pd.read_excel(uploaded_file, engine="openpyxl")
+    return pd.read_csv(uploaded_file)
+
+
+def compact_dtypes(df):
+    """Stores whole-number columns as int32 and Ensembl_ID as a categorical"""
+    for col in df.columns:
+        values = df[col]
+        if col == "Ensembl_ID":
+            df[col] = values.astype("category")
+        elif pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            arr = values.to_numpy()
+            if (
+                np.isfinite(arr).all()
+                and (arr == np.round(arr)).all()
+                and (arr.size == 0 or (arr.min() >= np.iinfo(np.int32).min and arr.max() <= np.iinfo(np.int32).max))
+            ):
+                df[col] = arr.astype(np.int32)
+    return df
+
+
+def cache_upload(uploaded_file):
+    """Returns (path, None) for the upload's Arrow cache file, parsing the upload only the first time its contents
+    are seen, or (None, df) when the parsed frame doesn't fit Arrow"""
+    key = upload_digest(uploaded_file)
+    path = upload_cache.get(key, ".feather")
+    if path is not None:
+        return path, None
+    df = compact_dtypes(parse_upload(uploaded_file))
+    try:
+        # Uncompressed, so reads skip decompression and read_genes can take rows straight from the mapped file
+        return upload_cache.put(key, ".feather", lambda p: feather.write_feather(df, p, compression="uncompressed")), None
+    except (pa.ArrowException, ValueError, TypeError):
+        # Mixed-type or non-string columns don't fit Arrow; serve the parsed frame uncached
+        return None, df
+
+
+def table_to_frame(table):
+    df = table.to_pandas()
+    if "Ensembl_ID" in df.columns:
+        # Pages index and transpose on the IDs, which needs plain strings
+        df["Ensembl_ID"] = df["Ensembl_ID"].astype(str)
+    return df
+
+
+@st.cache_resource(max_entries=8)
+def _upload_frame(digest, _uploaded_file):
+    path, df = cache_upload(_uploaded_file)
+    if path is None:
+        return df
+    return table_to_frame(feather.read_table(path, memory_map=True))
+
+
+def read_upload(uploaded_file):
+    """Loads an upload, parsing it only the first time its contents are seen
+
+    The frame is built once per distinct upload and shared by every rerun and session, so callers must not
+    modify it in place; use read_genes when only some genes' rows are needed.
+    """
+    return _upload_frame(upload_digest(uploaded_file), uploaded_file)
+
+
+def gene_index(uploaded_file):
+    """Returns (cache path, sorted Ensembl_IDs, their row numbers) for the upload, or None without an Arrow cache
+    or an Ensembl_ID column
+
+    The index is built from the ID column alone and kept on disk next to the upload's cache, so it is built once
+    per distinct file however many sessions look genes up in it.
+    """
+    path, _ = cache_upload(uploaded_file)
+    if path is None:
+        return None
+    if path not in _gene_indexes:
+        table = feather.read_table(path, memory_map=True)
+        if "Ensembl_ID" not in table.column_names:
+            return None
+        key = upload_digest(uploaded_file)
+        index_path = upload_cache.get(key, ".genes.feather")
+        if index_path is None:
+            ids = table.column("Ensembl_ID").to_pandas().astype(str).to_numpy()
+            rows = np.argsort(ids, kind="stable")
+            index = pd.DataFrame({"Ensembl_ID": ids[rows], "row": rows})
+            index_path = upload_cache.put(key, ".genes.feather", lambda p: feather.write_feather(index, p))
+        index = feather.read_feather(index_path)
+        if len(_gene_indexes) > 64:
+            _gene_indexes.clear()
+        _gene_indexes[path] = (index["Ensembl_ID"].to_numpy(), index["row"].to_numpy())
+    return (path, *_gene_indexes[path])
+
+
+def read_genes(uploaded_file, gene_ids):
+    """Returns the upload's rows for the given Ensembl_IDs, as a boolean filter of read_upload would
+
+    Rows are located through the gene index and taken from the memory-mapped cache, so time and memory grow with
+    the number of genes requested rather than the size of the file.
+    """
+    index = gene_index(uploaded_file)
+    if index is None:
+        df = read_upload(uploaded_file)
+        return df[df["Ensembl_ID"].isin(gene_ids)]
+    path, ids, rows = index
+    wanted = np.unique(np.asarray(gene_ids, dtype=str))
+    # Every row of a duplicated ID sits between its left and right insertion points
+    first = np.searchsorted(ids, wanted, side="left")
+    last = np.searchsorted(ids, wanted, side="right")
+    selected = np.sort(np.concatenate([rows[start:stop] for start, stop in zip(first, last)] + [rows[:0]]))
+    table = feather.read_table(path, memory_map=True).take(selected)
+    # Decode just the taken IDs rather than converting the whole categorical dictionary
+    table = table.set_column(
+        table.column_names.index("Ensembl_ID"), "Ensembl_ID", table.column("Ensembl_ID").cast(pa.string())
+    )
+    df = table_to_frame(table)
+    # Original row numbers as the index, matching a filter of the full frame
+    return df.set_axis(pd.Index(selected))
@@ -0,0 +1,289 @@
+import collections
+import inspect
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import traceback
+
+import streamlit as st
+from threadpoolctl import threadpool_limits
+
+from utils.workspace import session_id
+
+# Cores shared by every session's jobs, and how many jobs may run at once
+CPU_BUDGET = int(os.environ.get("OFSCD_CPU_BUDGET", os.cpu_count() or 1))
+MAX_RUNNING_JOBS = int(os.environ.get("OFSCD_MAX_JOBS", max(1, min(4, CPU_BUDGET // 2))))
+
+# Jobs nobody has looked at for this long are dropped with their results, as their session has most likely ended
+JOB_TTL_SECONDS = int(os.environ.get("OFSCD_JOB_TTL", 60 * 60))
+
+# (session id, job name) -> Job; lives for the server process, so jobs outlive script reruns
+_jobs = {}
+_lock = threading.Lock()
+_last_sweep = 0.0
+
+
+def _run(target, args, kwargs, messages, cores):
+    """Worker process entry point: runs target and reports progress, log lines, partial results and the outcome"""
+    # n_jobs=-1 in joblib (and so in GridSearchCV and PyDESeq2) resolves to this job's share
+    os.environ["LOKY_MAX_CPU_COUNT"] = str(cores)
+
+    def progress(done, total, message=""):
+        messages.put(("progress", (done, total, message)))
+
+    def log(*values):
+        messages.put(("log", " ".join(str(value) for value in values)))
+
+    def partial(value):
+        messages.put(("partial", value))
+
+    parameters = inspect.signature(target).parameters
+    if "progress" in parameters:
+        kwargs["progress"] = progress
+    if "log" in parameters:
+        kwargs["log"] = log
+    if "partial" in parameters:
+        kwargs["partial"] = partial
+    try:
+        # Cap BLAS/OpenMP threads in this process; joblib gives its workers one thread each
+        with threadpool_limits(limits=cores):
+            messages.put(("done", target(*args, **kwargs)))
+    except BaseException:
+        messages.put(("failed", traceback.format_exc()))
+
+
+class Governor:
+    """Process-wide scheduler that sizes each job from the CPU budget left idle by the running ones"""
+
+    def __init__(self, cpu_budget, max_running):
+        self.cpu_budget = cpu_budget
+        self.max_running = max_running
+        self.running = []
+        self.waiting = collections.deque()
+        self._lock = threading.RLock()
+
+    def enqueue(self, job):
+        with self._lock:
+            self.waiting.append(job)
+        self.schedule()
+
+    def remove(self, job):
+        with self._lock:
+            if job in self.waiting:
+                self.waiting.remove(job)
+
+    def schedule(self):
+        """Collects finished jobs and starts waiting ones while slots are free"""
+        starting = []
+        with self._lock:
+            for job in list(self.running):
+                job._update()
+                if job.status != "running":
+                    self.running.remove(job)
+            while self.waiting and len(self.running) < self.max_running:
+                # Idle cores are split evenly between the jobs that can start now
+                idle = self.cpu_budget - sum(job.cores for job in self.running)
+                sharing = min(len(self.waiting), self.max_running - len(self.running))
+                job = self.waiting.popleft()
+                job._reserve(max(1, idle // sharing))
+                self.running.append(job)
+                starting.append(job)
+        # Spawning a worker takes a while, so it happens outside the lock every page's poll goes through
+        for job in starting:
+            job._start()
+
+    def position(self, job):
+        """Returns the job's 1-based place in the queue"""
+        with self._lock:
+            return self.waiting.index(job) + 1 if job in self.waiting else 0
+
+    def utilization(self):
+        with self._lock:
+            return sum(job.cores for job in self.running), len(self.waiting)
+
+
+governor = Governor(CPU_BUDGET, MAX_RUNNING_JOBS)
+
+
+class Job:
+    """A long computation that waits for a slot, then runs in its own worker process"""
+
+    def __init__(self, key, target, args, kwargs):
+        self.key = key
+        self.status = "queued"
+        self.progress = (0, 0, "Waiting for a free slot...")
+        self.logs = []
+        # Latest partial result a target chose to publish while running
+        self.partial = None
+        self.result = None
+        self.error = None
+        self._call = (target, args, kwargs)
+        self._process = None
+        # Set once the worker process exists; until then the job holds its slot but has nothing to poll
+        self._started = threading.Event()
+        self.cores = 0
+        self.last_seen = time.monotonic()
+
+    def _reserve(self, cores):
+        self.cores = cores
+        self.status = "running"
+        self.progress = (0, 0, f"Starting worker on {cores} core(s)...")
+
+    def _start(self):
+        # Spawned, not forked, so the worker doesn't inherit Streamlit's threads
+        context = multiprocessing.get_context("spawn")
+        self._messages = context.Queue()
+        target, args, kwargs = self._call
+        self._process = context.Process(target=_run, args=(target, args, kwargs, self._messages, self.cores))
+        self._process.start()
+        self._call = None
+        self._started.set()
+
+    def _drain(self, timeout=None):
+        while True:
+            try:
+                kind, payload = self._messages.get(timeout=timeout) if timeout else self._messages.get_nowait()
+            except queue.Empty:
+                return
+            timeout = None
+            if kind == "progress":
+                self.progress = payload
+            elif kind == "log":
+                self.logs.append(payload)
+            elif kind == "partial":
+                self.partial = payload
+            elif kind == "done":
+                self.status, self.result = "done", payload
+            elif kind == "failed":
+                self.status, self.error = "failed", payload
+
+    def _update(self):
+        """Applies any messages from a running worker"""
+        if self.status != "running" or not self._started.is_set():
+            return
+        self._drain()
+        if self.status == "running" and not self._process.is_alive():
+            # The outcome may still be in the pipe when the process exits
+            self._drain(timeout=1)
+            if self.status == "running":
+                self.status = "failed"
+                self.error = f"Worker exited unexpectedly with code {self._process.exitcode}"
+        if self.status != "running":
+            self._process.join()
+
+    def poll(self):
+        """Advances the scheduler and returns the job's current status"""
+        governor.schedule()
+        return self.status
+
+    def cancel(self):
+        status = self.poll()
+        if status == "queued":
+            governor.remove(self)
+            self.status = "cancelled"
+        elif status == "running":
+            self._started.wait()
+            self._process.terminate()
+            self._process.join()
+            self.status = "cancelled"
+            governor.schedule()
+
+
+def sweep_jobs(ttl_seconds=JOB_TTL_SECONDS):
+    """Cancels and forgets jobs whose page hasn't followed them for longer than ttl_seconds"""
+    cutoff = time.monotonic() - ttl_seconds
+    with _lock:
+        stale = [job_id for job_id, job in _jobs.items() if job.last_seen < cutoff]
+        jobs = [_jobs.pop(job_id) for job_id in stale]
+    for job in jobs:
+        job.cancel()
+
+
+def submit(name, key, target, *args, **kwargs):
+    """Returns this session's job called name, queueing a new one when key differs from the last submission
+
+    Stale jobs from every session are swept at most once a minute.
+    """
+    global _last_sweep
+    if time.monotonic() - _last_sweep > 60:
+        _last_sweep = time.monotonic()
+        sweep_jobs()
+    job_id = (session_id(), name)
+    with _lock:
+        replaced = job = _jobs.get(job_id)
+        created = job is None or job.key != key
+        if created:
+            job = _jobs[job_id] = Job(key, target, args, kwargs)
+        job.last_seen = time.monotonic()
+    # Cancelling and queueing can start worker processes, so neither holds the registry lock
+    if created and replaced is not None:
+        replaced.cancel()
+    if created:
+        governor.enqueue(job)
+    return job
+
+
+def discard(name):
+    with _lock:
+        job = _jobs.pop((session_id(), name), None)
+    if job is not None:
+        job.cancel()
+
+
+@st.fragment(run_every=2.0)
+def _compute_panel(job=None, label=None):
+    cores_in_use, waiting = governor.utilization()
+    st.markdown("### ⚙️ Compute")
+    st.progress(min(cores_in_use / CPU_BUDGET, 1.0), text=f"{cores_in_use}/{CPU_BUDGET} cores in use")
+    st.caption(f"{waiting} job(s) waiting, up to {governor.max_running} run at once")
+    # Where the job this page follows stands in the queue
+    position = governor.position(job) if job is not None else 0
+    if position:
+        st.info(f"{label}: position {position} in queue")
+
+
+@st.fragment(run_every=1.0)
+def _progress_panel(name, job, label):
+    job.last_seen = time.monotonic()
+    status = job.poll()
+    if status not in ("queued", "running"):
+        # Rerun the whole page so it can pick up the result
+        st.rerun()
+    if status == "queued":
+        st.progress(0.0, text=f"{label}: waiting for a free slot")
+    else:
+        done, total, message = job.progress
+        st.progress(min(done / total, 1.0) if total else 0.0, text=f"{label}: {message}")
+    for line in job.logs:
+        st.write(line)
+    if job.partial is not None:
+        st.write("Finished so far", job.partial)
+    if st.button("Cancel", key=f"cancel_{name}"):
+        job.cancel()
+        st.rerun()
+
+
+def follow(name, job, label):
+    """Renders the job's progress and returns its result once finished, stopping the script until then"""
+    with st.sidebar:
+        _compute_panel(job, label)
+    job.last_seen = time.monotonic()
+    status = job.poll()
+    if status == "done":
+        for line in job.logs:
+            st.write(line)
+        return job.result
+    if status in ("queued", "running"):
+        _progress_panel(name, job, label)
+    else:
+        if status == "failed":
+            st.error(f"{label} failed")
+            st.code(job.error)
+        else:
+            st.warning(f"{label} was cancelled")
+        if st.button("Run again", key=f"rerun_{name}"):
+            discard(name)
+            st.rerun()
+    st.stop()
@@ -0,0 +1,458 @@
+import inspect
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from imblearn.pipeline import Pipeline
+from joblib import Memory, Parallel, delayed, effective_n_jobs
+from sklearn.base import clone
+from sklearn.preprocessing import LabelEncoder
+from sklearn.svm import SVC
+from sklearn.naive_bayes import GaussianNB
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import ParameterGrid, check_cv
+from imblearn.over_sampling import SVMSMOTE, RandomOverSampler, BorderlineSMOTE, ADASYN, SMOTE, SMOTEN, KMeansSMOTE
+from imblearn.combine import SMOTEENN, SMOTETomek
+from sklearn.metrics import accuracy_score, classification_report, f1_score, precision_score, recall_score
+
+from utils.cache import CACHE_ROOT, DiskCache, content_hash
+from utils.preprocessing import CountTransformer
+from utils.roc import label_samples
+from utils.tuning import (
+    BudgetedSearchCV, PrecomputedKernelSearchCV, ProgressGridSearchCV, VarSmoothingSearchCV, WarmStartPathSearchCV
+)
+
+BALANCING_METHODS = {
+    'RandomOverSampler': RandomOverSampler,
+    'SVMSMOTE': SVMSMOTE,
+    'SMOTEENN': SMOTEENN,
+    'SMOTETomek': SMOTETomek,
+    'ADASYN': ADASYN,
+    'BorderlineSMOTE': BorderlineSMOTE,
+    'KMeansSMOTE': KMeansSMOTE,
+    'SMOTEN': SMOTEN,
+}
+
+# Resampled training sets, shared by every page, session and worker process
+resample_cache = DiskCache("resampled", max_bytes=1024 ** 3)
+
+# Fitted transform steps, keyed by the transform's settings and its training rows
+transform_memory = Memory(os.path.join(CACHE_ROOT, "transforms"), verbose=0)
+TRANSFORM_CACHE_BYTES = 1024 ** 3
+
+# Untuned defaults, tuning grids, the exhaustive search used to tune them and its extra options, and settings
+# overridden while cross-validating, for each estimator; add more with register_estimator
+ESTIMATORS = {
+    'SVM': {
+        'estimator': SVC,
+        'default_params': {'kernel': 'linear', 'probability': True},
+        'param_grid': {
+            'kernel': ['poly', 'rbf', 'linear'],
+            'C': [0.1, 1, 10],
+            'gamma': [0.01, 0.1, 1],
+            'coef0': [0, 1],
+            'class_weight': [None, 'balanced'],
+            'probability': [True]
+        },
+        'search': PrecomputedKernelSearchCV,
+        'grid_kwargs': {},
+        # Platt scaling only matters for predict_proba, which accuracy scoring never calls
+        'cv_params': {'probability': False},
+    },
+    'Naive Bayes': {
+        'estimator': GaussianNB,
+        'default_params': {},
+        'param_grid': {
+            'var_smoothing': np.logspace(0, -9, num=100)
+        },
+        'search': VarSmoothingSearchCV,
+        'grid_kwargs': {'return_train_score': True},
+        'cv_params': {},
+    },
+    'Logistic Regression': {
+        'estimator': LogisticRegression,
+        'default_params': {'max_iter': 1000},
+        'param_grid': {
+            'penalty': ['l1', 'l2'],
+            'C': [0.001, 0.01, 0.1, 1, 10, 100],
+            'solver': ['liblinear', 'saga'],
+            'class_weight': [None, 'balanced'],
+            'max_iter': [1000]
+        },
+        'search': WarmStartPathSearchCV,
+        'grid_kwargs': {},
+        'cv_params': {},
+    },
+}
+
+# Search strategies offered on the modelling pages; 'grid' is each estimator's exhaustive search
+SEARCH_STRATEGIES = {
+    'Exhaustive grid': 'grid',
+    'Successive halving over samples': 'halving_samples',
+    'Successive halving over CV folds': 'halving_folds',
+    'Random sampling': 'random',
+    'Adaptive sampling (Bayesian-style)': 'bayesian',
+}
+
+# Feature preprocessing offered on the modelling page, fitted after resampling inside each CV fold
+TRANSFORMS = {
+    'None (raw counts)': 'none',
+    'log1p': 'log1p',
+    'Standardize': 'standardize',
+    'Variance-stabilizing (DESeq2-style)': 'vst',
+}
+
+RESULT_COLUMNS = [
+    'Estimator', 'Balancing Method', 'Train Accuracy', 'Test Accuracy', 'Test F1 Score',
+    'Test Precision', 'Test Recall', 'Train Classification Report', 'Test Classification Report',
+    'Fits', 'Fit Time (s)'
+]
+
+
+def register_estimator(name, estimator, param_grid, default_params=None, search=ProgressGridSearchCV,
+                       grid_kwargs=None, cv_params=None):
+    """Makes an estimator available to the modelling page and pipeline
+
+    Searches that accept a prepare callable get resampling and transforms fitted inside each fold;
+    any other search is given the whole sampler -> transform -> estimator pipeline instead.
+    """
+    ESTIMATORS[name] = {
+        'estimator': estimator,
+        'default_params': default_params or {},
+        'param_grid': param_grid,
+        'search': search,
+        'grid_kwargs': grid_kwargs or {},
+        'cv_params': cv_params or {},
+    }
+
+
+def prepare_dataset(data, index_col):
+    """Builds the samples x genes feature matrix and cancer/normal labels from a genes x samples dataset"""
+    # One rounding pass and one transpose; X is a view of the same block. Counts fit in 32 bits, half
+    # the memory of the default int64
+    data = data.set_index(index_col).round().astype(np.int32).T
+    X = data.to_numpy()
+
+    data['label'] = label_samples(data.index)
+    y = np.asarray(data['label'])
+    return X, y, data
+
+
+def make_balancer(method_name, sampling_strategy, random_state):
+    """Creates the sampler for a balancing method, or None for 'No Balancing'"""
+    if method_name == "No Balancing":
+        return None
+    return BALANCING_METHODS[method_name](random_state=random_state, sampling_strategy=sampling_strategy)
+
+
+def make_transform(method):
+    """Creates the preprocessing step for one of TRANSFORMS, or None for 'none'"""
+    if method == 'none':
+        return None
+    return CountTransformer(method)
+
+
+def resample(sampler, X_train, y_train):
+    """Resamples the training set, reusing the cached result for the same data and sampler settings"""
+    # Labels are hashed and stored as strings; object arrays would hash their pointers
+    key = content_hash(X_train, np.asarray(y_train, dtype=str), type(sampler).__name__,
+                       sorted(sampler.get_params().items()))
+    path = resample_cache.get(key, ".npz")
+    if path is not None:
+        try:
+            with np.load(path) as cached:
+                return cached["X"], cached["y"].astype(np.asarray(y_train).dtype)
+        except FileNotFoundError:
+            # Evicted by another process between the lookup and the read
+            pass
+    X_resampled, y_resampled = clone(sampler).fit_resample(X_train, y_train)
+    resample_cache.put(key, ".npz", lambda p: np.savez(p, X=X_resampled, y=np.asarray(y_resampled, dtype=str)))
+    return X_resampled, y_resampled
+
+
+@transform_memory.cache
+def _fit_transform_step(transform, X_train):
+    return clone(transform).fit(X_train)
+
+
+def fit_transform_step(transform, X_train):
+    """Fits a transform step, reusing an earlier fit on the same rows"""
+    fitted = _fit_transform_step(transform, X_train)
+    transform_memory.reduce_size(bytes_limit=TRANSFORM_CACHE_BYTES)
+    return fitted
+
+
+def front_steps(method_name, sampling_strategy=0.3, random_state=42, transform=None):
+    """The sampler and transform steps every estimator's pipeline starts with"""
+    return [
+        ('sampler', make_balancer(method_name, sampling_strategy, random_state) or 'passthrough'),
+        ('transform', transform if transform is not None else 'passthrough'),
+    ]
+
+
+def build_pipeline(estimator_name, method_name, sampling_strategy=0.3, random_state=42, params=None, transform=None):
+    """The sampler -> transform -> estimator pipeline for one estimator and balancing method"""
+    config = ESTIMATORS[estimator_name]
+    estimator = config['estimator'](**(config['default_params'] if params is None else params))
+    return Pipeline(front_steps(method_name, sampling_strategy, random_state, transform) + [('estimator', estimator)])
+
+
+def fit_front(steps, X_train, y_train, X_test=None):
+    """Fits a pipeline's sampler and transform steps through the shared caches
+
+    Returns the fitted steps with the prepared training rows, their labels and the transformed test rows.
+    """
+    fitted = []
+    for name, step in steps:
+        if step is not None and step != 'passthrough':
+            if hasattr(step, 'fit_resample'):
+                X_train, y_train = resample(step, X_train, y_train)
+            else:
+                step = fit_transform_step(step, X_train)
+                X_train = step.transform(X_train)
+                if X_test is not None:
+                    X_test = step.transform(X_test)
+        fitted.append((name, step))
+    return fitted, X_train, y_train, X_test
+
+
+def min_class_samples(sampler):
+    """Fewest rows of each class a sampler's nearest-neighbour searches can run on: the neighbours plus the row"""
+    if sampler is None or sampler == 'passthrough':
+        return 1
+    # SMOTEENN and SMOTETomek build a default SMOTE when none is given
+    steps = [sampler, getattr(sampler, 'smote', None) or (SMOTE() if hasattr(sampler, 'smote') else None),
+             getattr(sampler, 'enn', None)]
+    needed = [1]
+    for step in steps:
+        for name in ('k_neighbors', 'n_neighbors'):
+            neighbours = getattr(step, name, None)
+            neighbours = getattr(neighbours, 'n_neighbors', neighbours)
+            if isinstance(neighbours, int):
+                needed.append(neighbours + 1)
+    return max(needed)
+
+
+class FoldPreparer:
+    """Applies a pipeline's sampler and transform to one CV fold, for searches that take a prepare callable"""
+
+    def __init__(self, pipeline):
+        self.steps = pipeline.steps[:-1]
+        self.min_class_samples = min_class_samples(pipeline.named_steps['sampler'])
+
+    def __call__(self, X_train, y_train, X_test):
+        _, X_train, y_train, X_test = fit_front(self.steps, X_train, y_train, X_test)
+        return X_train, y_train, X_test
+
+
+def fit_pipeline(pipeline, X_train, y_train):
+    """Fits a pipeline, returning it with the resampled and transformed rows its estimator was trained on"""
+    fitted, X_prepared, y_prepared, _ = fit_front(pipeline.steps[:-1], X_train, y_train)
+    name, estimator = pipeline.steps[-1]
+    estimator = clone(estimator).fit(X_prepared, y_prepared)
+    return Pipeline(fitted + [(name, estimator)]), X_prepared, y_prepared
+
+
+def evaluate_model(estimator_name, method_name, y_train_encoded, y_pred_train, y_test_encoded, y_pred_test,
+                   label_encoder):
+    """Scores a fitted model's train and test predictions as one results row"""
+    return {
+        'Estimator': estimator_name,
+        'Balancing Method': method_name,
+        'Train Accuracy': accuracy_score(y_train_encoded, y_pred_train),
+        'Test Accuracy': accuracy_score(y_test_encoded, y_pred_test),
+        'Test F1 Score': f1_score(y_test_encoded, y_pred_test, average='weighted'),
+        'Test Precision': precision_score(y_test_encoded, y_pred_test, average='weighted'),
+        'Test Recall': recall_score(y_test_encoded, y_pred_test, average='weighted'),
+        'Train Classification Report': classification_report(y_train_encoded, y_pred_train, target_names=label_encoder.classes_),
+        'Test Classification Report': classification_report(y_test_encoded, y_pred_test, target_names=label_encoder.classes_)
+    }
+
+
+def make_search(estimator_name, pipeline, search='grid', n_candidates=None, time_budget=None, random_state=42,
+                progress=None, n_jobs=-1):
+    """Creates the hyperparameter search for an estimator using one of SEARCH_STRATEGIES
+
+    The search tunes the pipeline's estimator with the pipeline's sampler and transform fitted inside each fold.
+    The engine refits the winner itself, so searches don't.
+    """
+    config = ESTIMATORS[estimator_name]
+    if search != 'grid':
+        prepare = FoldPreparer(pipeline)
+        return BudgetedSearchCV(config['estimator'](), config['param_grid'], strategy=search,
+                                n_candidates=n_candidates, time_budget=time_budget, cv=5, scoring='accuracy',
+                                n_jobs=n_jobs, verbose=0, random_state=random_state, cv_params=config['cv_params'],
+                                refit=False, prepare=prepare, progress=progress,
+                                min_class_samples=prepare.min_class_samples)
+    if 'prepare' in inspect.signature(config['search']).parameters:
+        return config['search'](config['estimator'](), config['param_grid'], cv=5, scoring='accuracy',
+                                n_jobs=n_jobs, verbose=0, refit=False, prepare=FoldPreparer(pipeline),
+                                progress=progress, **config['grid_kwargs'])
+    param_grid = {f'estimator__{name}': values for name, values in config['param_grid'].items()}
+    return config['search'](pipeline, param_grid, cv=5, scoring='accuracy', n_jobs=n_jobs, verbose=0, refit=False,
+                            progress=progress, **config['grid_kwargs'])
+
+
+def train_model(X_train, X_test, y_train, y_test, method_name, estimator_name, sampling_strategy=0.3,
+                random_state=42, tune=False, log=print, progress=None, search='grid', n_candidates=None,
+                time_budget=None, n_jobs=-1, transform=None):
+    """Tunes and fits one estimator's pipeline for a balancing method and returns its results row"""
+    config = ESTIMATORS[estimator_name]
+    log(f"{estimator_name}: processing with {method_name}...")
+
+    # Encode labels
+    label_encoder = LabelEncoder()
+    y_train_encoded = label_encoder.fit_transform(y_train)
+    y_test_encoded = label_encoder.transform(y_test)
+
+    pipeline = build_pipeline(estimator_name, method_name, sampling_strategy, random_state, transform=transform)
+
+    # Train model
+    start = time.perf_counter()
+    fits = 1
+    if tune:
+        log(f"{estimator_name}: performing hyperparameter tuning...")
+        grid_search = make_search(estimator_name, pipeline, search, n_candidates, time_budget, random_state,
+                                  progress, n_jobs)
+        grid_search.fit(X_train, y_train_encoded)
+        best_params = {name.removeprefix('estimator__'): value for name, value in grid_search.best_params_.items()}
+        pipeline = build_pipeline(estimator_name, method_name, sampling_strategy, random_state, best_params, transform)
+        if getattr(grid_search, 'timed_out_', False):
+            log("Time budget reached, keeping the best model found so far")
+        log(f"{estimator_name}: best hyperparameters:", best_params)
+        # Searches that skip work report their own count; a full grid fits every candidate on every split
+        fits += getattr(grid_search, 'n_fits_', len(grid_search.cv_results_['params']) * grid_search.n_splits_)
+        if getattr(grid_search, 'n_pruned_fits_', 0):
+            log(f"Skipped {grid_search.n_pruned_fits_} fits of candidates that could no longer win")
+    model, X_train_prepared, y_train_prepared = fit_pipeline(pipeline, X_train, y_train_encoded)
+    fit_time = time.perf_counter() - start
+
+    # Training scores are on the resampled training set, which is what the estimator saw; the pipeline
+    # skips its sampler when predicting the test set
+    row = evaluate_model(estimator_name, method_name, y_train_prepared, model[-1].predict(X_train_prepared),
+                         y_test_encoded, model.predict(X_test), label_encoder)
+    row['Fits'] = fits
+    row['Fit Time (s)'] = round(fit_time, 3)
+    return row
+
+
+def _train_in_worker(X_train, X_test, y_train, y_test, method_name, estimator_name, options):
+    """Pool task for one model; log lines are sent back with the row"""
+    lines = []
+    row = train_model(X_train, X_test, y_train, y_test, method_name, estimator_name,
+                      log=lambda *values: lines.append(" ".join(str(value) for value in values)), **options)
+    return row, lines
+
+
+def _warm_shared_work(X_train, y_train, methods, sampling_strategy, random_state, transform, tune):
+    """Resamples and transforms the training set, and each CV fold when tuning, once for all estimators"""
+    y_train_encoded = LabelEncoder().fit_transform(y_train)
+    folds = list(check_cv(5, y_train_encoded, classifier=True).split(X_train, y_train_encoded)) if tune else []
+    for method_name in methods:
+        steps = front_steps(method_name, sampling_strategy, random_state, transform)
+        fit_front(steps, X_train, y_train_encoded)
+        for train, test in folds:
+            fit_front(steps, X_train[train], y_train_encoded[train], X_train[test])
+
+
+def run_models(X_train, X_test, y_train, y_test, methods, estimator_names, sampling_strategy=0.3, random_state=42,
+               tune=False, log=print, progress=None, search='grid', n_candidates=None, time_budget=None,
+               transform=None, partial=None):
+    """Trains and evaluates every estimator with every balancing method, in parallel when there are cores to spare"""
+    options = dict(sampling_strategy=sampling_strategy, random_state=random_state, tune=tune, search=search,
+                   n_candidates=n_candidates, time_budget=time_budget, transform=transform)
+    runs = [(estimator_name, method_name) for estimator_name in estimator_names for method_name in methods]
+    # Progress counts grid candidates when tuning, otherwise one step per model
+    steps = {
+        name: len(ParameterGrid(ESTIMATORS[name]['param_grid'])) if tune else 1 for name in estimator_names
+    }
+    total = sum(steps[name] for name, _ in runs)
+    rows = {}
+
+    def collect(row):
+        rows[row['Estimator'], row['Balancing Method']] = row
+        if partial is not None:
+            partial(pd.DataFrame([rows[run] for run in runs if run in rows], columns=RESULT_COLUMNS))
+
+    if len(estimator_names) > 1:
+        # Estimators share the resampled and transformed sets; build them before the runs race to
+        if progress is not None:
+            progress(0, total, "Resampling training sets")
+        _warm_shared_work(X_train, y_train, methods, sampling_strategy, random_state, transform, tune)
+
+    workers = min(len(runs), effective_n_jobs(-1))
+    if workers <= 1:
+        offset = 0
+        for estimator_name, method_name in runs:
+            run_progress = None
+            if progress is not None:
+                progress(offset, total, f"{estimator_name}: {method_name}")
+                run_progress = (
+                    lambda candidates, _, offset=offset, name=f"{estimator_name}: {method_name}",
+                    size=steps[estimator_name]:
+                    progress(offset + candidates, total, f"{name}: {candidates}/{size} candidates")
+                )
+            collect(train_model(X_train, X_test, y_train, y_test, method_name, estimator_name,
+                                log=log, progress=run_progress, **options))
+            offset += steps[estimator_name]
+    else:
+        # One worker per model, each search getting an equal share of the cores. Arrays reach the
+        # workers as read-only memory maps instead of pickled copies.
+        options['n_jobs'] = max(1, effective_n_jobs(-1) // workers)
+        if progress is not None:
+            progress(0, total, f"Training {len(runs)} models on {workers} workers")
+        tasks = Parallel(n_jobs=workers, max_nbytes=0, mmap_mode='r', return_as='generator_unordered')(
+            delayed(_train_in_worker)(X_train, X_test, y_train, y_test, method_name, estimator_name, options)
+            for estimator_name, method_name in runs
+        )
+        done = 0
+        for row, lines in tasks:
+            for line in lines:
+                log(line)
+            collect(row)
+            done += steps[row['Estimator']]
+            if progress is not None:
+                progress(done, total, f"{len(rows)}/{len(runs)} models finished")
+    return pd.DataFrame([rows[run] for run in runs], columns=RESULT_COLUMNS)
+
+
+def benchmark_transforms(X_train, y_train, estimator_names, methods=tuple(TRANSFORMS.values()), progress=None):
+    """Times each estimator's default fit on the training set under every preprocessing method
+
+    Reports the transform and fit times, the solver iterations where the estimator exposes them, the size of
+    the feature matrix the estimator saw and the fit speed-up over raw counts.
+    """
+    y_train = LabelEncoder().fit_transform(y_train)
+    rows = []
+    total = len(estimator_names) * len(methods)
+    for estimator_name in estimator_names:
+        config = ESTIMATORS[estimator_name]
+        for method in methods:
+            if progress is not None:
+                progress(len(rows), total, f"{estimator_name}: {method}")
+            transform = make_transform(method)
+            start = time.perf_counter()
+            X_prepared = X_train if transform is None else clone(transform).fit_transform(X_train)
+            transform_time = time.perf_counter() - start
+            start = time.perf_counter()
+            estimator = config['estimator'](**config['default_params']).fit(X_prepared, y_train)
+            fit_time = time.perf_counter() - start
+            n_iter = getattr(estimator, 'n_iter_', None)
+            rows.append({
+                'Estimator': estimator_name,
+                'Preprocessing': method,
+                'Transform Time (s)': transform_time,
+                'Fit Time (s)': fit_time,
+                'Iterations': int(np.max(n_iter)) if n_iter is not None else None,
+                'Feature Bytes': X_prepared.nbytes,
+            })
+    results = pd.DataFrame(rows).astype({'Iterations': 'Int64'})
+    baseline = results[results['Preprocessing'] == 'none'].set_index('Estimator')['Fit Time (s)']
+    results['Fit Speed-up'] = (results['Estimator'].map(baseline) / results['Fit Time (s)']).round(2)
+    return results.round({'Transform Time (s)': 4, 'Fit Time (s)': 4})
+
+
+def run_balancing_methods(X_train, X_test, y_train, y_test, methods, estimator_name, **options):
+    """Trains and evaluates one estimator once per balancing method"""
+    return run_models(X_train, X_test, y_train, y_test, methods, [estimator_name], **options)
@@ -0,0 +1,193 @@
+"""Headless segregation -> DEG -> ROC -> dataset -> modelling runner
+
+Usage: python -m utils.pipeline config.toml [--fresh]
+"""
+import argparse
+import hashlib
+import logging
+import os
+import tomllib
+
+import pandas as pd
+from sklearn.model_selection import train_test_split
+
+from utils.cache import DiskCache, content_hash
+from utils.deg import create_metadata, filter_deg_results, initiate_deg, prefilter_counts
+from utils.modelling import make_transform, prepare_dataset, run_balancing_methods
+from utils.roc import label_samples, roc_table
+from utils.segregation import partition_by_race
+
+logger = logging.getLogger("pipeline")
+
+DEFAULTS = {
+    "deg": {
+        "cutoff_padj": 0.05, "cutoff_log2FoldChange": 0.0, "cutoff_baseMean": 10, "upregulated_only": True,
+        "min_count": 0, "min_samples": 0, "expression_quantile": 0.0,
+    },
+    "roc": {"auc_threshold": 0.9},
+    "model": {
+        "estimators": ["SVM", "Naive Bayes", "Logistic Regression"],
+        "balancing_methods": ["No Balancing"],
+        "sampling_strategy": 0.3,
+        "random_state": 42,
+        "test_size": 0.4,
+        "stratify": True,
+        "tune": False,
+        "search": "grid",
+        "n_candidates": 0,
+        "time_budget": 0,
+        "transform": "none",
+    },
+    "output": {"directory": "pipeline_output"},
+}
+
+# Stage results are pickled here so an interrupted run resumes where it stopped
+checkpoints = DiskCache("pipeline", max_bytes=8 * 1024 ** 3)
+
+
+def load_config(path):
+    """Reads a TOML config and fills in the defaults for any missing section or key"""
+    with open(path, "rb") as f:
+        config = tomllib.load(f)
+    for section, values in DEFAULTS.items():
+        config[section] = {**values, **config.get(section, {})}
+    return config
+
+
+def read_table(path):
+    if path.endswith(".xlsx"):
+        return pd.read_excel(path, engine="openpyxl")
+    return pd.read_csv(path)
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def run_stage(name, key, compute, resume=True):
+    """Returns the checkpointed result for key, computing and checkpointing it on a miss"""
+    path = checkpoints.get(key, ".pkl") if resume else None
+    if path is not None:
+        logger.info("%s: resumed from checkpoint", name)
+        return pd.read_pickle(path)
+    logger.info("%s: running", name)
+    result = compute()
+    checkpoints.put(key, ".pkl", lambda p: pd.to_pickle(result, p))
+    return result
+
+
+def prefilter_settings(deg_config):
+    return {name: deg_config[name] for name in ("min_count", "min_samples", "expression_quantile")}
+
+
+def deg_stage(matched, deg_config):
+    counts_data, removed = prefilter_counts(matched, **prefilter_settings(deg_config))
+    logger.info("Pre-filtering removed %d genes: %s", sum(removed.values()), removed)
+    return initiate_deg(counts_data, create_metadata(counts_data))
+
+
+def candidate_genes(deg_results, deg_config):
+    """Applies the DEG cutoffs, keeping only upregulated genes unless configured otherwise"""
+    filtered = filter_deg_results(
+        deg_results, deg_config["cutoff_padj"], deg_config["cutoff_log2FoldChange"], deg_config["cutoff_baseMean"]
+    )
+    if deg_config["upregulated_only"]:
+        filtered = filtered[filtered["log2FoldChange"] > 0]
+    return filtered.index
+
+
+def model_stage(dataset, estimator_name, model_config):
+    X, y, _ = prepare_dataset(dataset.reset_index(), "Ensembl_ID")
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=model_config["test_size"], random_state=42, stratify=y if model_config["stratify"] else None
+    )
+    return run_balancing_methods(
+        X_train, X_test, y_train, y_test, model_config["balancing_methods"], estimator_name,
+        sampling_strategy=model_config["sampling_strategy"], random_state=model_config["random_state"],
+        tune=model_config["tune"], log=lambda *args: logger.info(" ".join(str(arg) for arg in args)),
+        # TOML has no null, so 0 means no budget
+        search=model_config["search"], n_candidates=model_config["n_candidates"] or None,
+        time_budget=model_config["time_budget"] or None, transform=make_transform(model_config["transform"])
+    )
+
+
+def run_pipeline(config, resume=True):
+    """Runs every stage for each configured race and writes the final tables to the output directory"""
+    inputs = config["input"]
+    output_dir = config["output"]["directory"]
+    os.makedirs(output_dir, exist_ok=True)
+
+    segregate_key = content_hash(
+        "segregate", file_digest(inputs["phenotype"]), file_digest(inputs["counts"]), inputs["races"]
+    )
+    partitions = run_stage(
+        "segregate",
+        segregate_key,
+        lambda: partition_by_race(read_table(inputs["phenotype"]), read_table(inputs["counts"]), inputs["races"]),
+        resume,
+    )
+
+    outputs = {}
+    for race, matched in partitions.items():
+        prefix = race.replace(" ", "_")
+        if len(set(label_samples(matched.columns[1:]))) < 2:
+            logger.warning("%s: skipped, needs both cancer and normal samples", race)
+            continue
+
+        deg_key = content_hash("deg", segregate_key, race, prefilter_settings(config["deg"]))
+        deg_results = run_stage(f"{race}/deg", deg_key, lambda: deg_stage(matched, config["deg"]), resume)
+        genes = candidate_genes(deg_results, config["deg"])
+
+        roc_key = content_hash("roc", deg_key, config["deg"])
+        roc_df = run_stage(
+            f"{race}/roc", roc_key, lambda: roc_table(matched[matched["Ensembl_ID"].isin(genes)]), resume
+        )
+        high_auc_genes = roc_df.loc[roc_df["ROC"] > config["roc"]["auc_threshold"], "Ensembl_ID"]
+
+        dataset_key = content_hash("dataset", roc_key, config["roc"])
+        dataset = run_stage(
+            f"{race}/dataset",
+            dataset_key,
+            lambda: matched[matched["Ensembl_ID"].isin(high_auc_genes)].set_index("Ensembl_ID"),
+            resume,
+        )
+
+        deg_results.to_csv(os.path.join(output_dir, f"{prefix}_deg.csv"))
+        roc_df.to_csv(os.path.join(output_dir, f"{prefix}_roc.csv"), index=False)
+        dataset.to_csv(os.path.join(output_dir, f"{prefix}_dataset.csv"))
+        outputs[race] = {"deg": deg_results, "roc": roc_df, "dataset": dataset}
+
+        if dataset.empty:
+            logger.warning("%s: no genes passed the AUC threshold, skipping modelling", race)
+            continue
+        for estimator_name in config["model"]["estimators"]:
+            model_key = content_hash("model", dataset_key, config["model"], estimator_name)
+            results_df = run_stage(
+                f"{race}/{estimator_name}",
+                model_key,
+                lambda: model_stage(dataset, estimator_name, config["model"]),
+                resume,
+            )
+            results_df.to_csv(
+                os.path.join(output_dir, f"{prefix}_{estimator_name.replace(' ', '_')}_results.csv"), index=False
+            )
+            outputs[race][estimator_name] = results_df
+    return outputs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the segregation -> DEG -> ROC -> modelling workflow headlessly")
+    parser.add_argument("config", help="TOML file with [input], [deg], [roc], [model] and [output] sections")
+    parser.add_argument("--fresh", action="store_true", help="ignore existing checkpoints and recompute every stage")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    run_pipeline(load_config(args.config), resume=not args.fresh)
+
+
+if __name__ == "__main__":
+    main()
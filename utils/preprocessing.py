@@ -0,0 +1,72 @@
+import numpy as np
+from pydeseq2.preprocessing import deseq2_norm_fit, deseq2_norm_transform
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.utils.validation import check_is_fitted
+
+PREPROCESSING_METHODS = ('log1p', 'standardize', 'vst')
+
+# DESeq2's floor for dispersion estimates
+MIN_DISPERSION = 1e-8
+
+
+class CountTransformer(TransformerMixin, BaseEstimator):
+    """Rescales raw counts to float32 features that solvers converge on quickly
+
+    'log1p' takes log(1 + count), 'standardize' centres and scales each gene, and 'vst' applies DESeq2's
+    median-of-ratios size factors and its variance-stabilizing transform for a single mean dispersion
+    (fitType="mean"). Everything is learnt from the training rows only, so it fits inside CV folds.
+    """
+
+    def __init__(self, method='log1p'):
+        self.method = method
+
+    def fit(self, X, y=None):
+        if self.method not in PREPROCESSING_METHODS:
+            raise ValueError(f"method must be one of {PREPROCESSING_METHODS}, got {self.method!r}")
+        X = np.asarray(X, dtype=np.float64)
+        self.n_features_in_ = X.shape[1]
+        if self.method == 'standardize':
+            self.mean_ = X.mean(axis=0).astype(np.float32)
+            scale = X.std(axis=0)
+            scale[scale == 0] = 1.0
+            self.scale_ = scale.astype(np.float32)
+        elif self.method == 'vst':
+            # Same median-of-ratios reference the DEG step's DESeq2 fit uses
+            self.logmeans_, self.filtered_genes_ = deseq2_norm_fit(X)
+            # Fallback reference when every gene has a zero somewhere and there is no geometric mean to compare with
+            depth = X.sum(axis=1)
+            self.reference_depth_ = float(np.exp(np.log(depth[depth > 0]).mean())) if (depth > 0).any() else 1.0
+            normed = self._normalize(X)
+            mean = normed.mean(axis=0)
+            variance = normed.var(axis=0, ddof=1)
+            # Method-of-moments gene-wise dispersions, averaged like DESeq2 does for fitType="mean"
+            with np.errstate(divide='ignore', invalid='ignore'):
+                dispersions = (variance - mean) / mean ** 2
+            usable = dispersions[dispersions >= MIN_DISPERSION * 10]
+            self.dispersion_ = float(usable.mean()) if usable.size else MIN_DISPERSION
+        return self
+
+    def _normalize(self, X):
+        """Divides counts by median-of-ratios size factors against the training reference"""
+        if self.filtered_genes_.any():
+            normed, _ = deseq2_norm_transform(X, self.logmeans_, self.filtered_genes_)
+            return normed
+        size_factors = X.sum(axis=1) / self.reference_depth_
+        size_factors[size_factors == 0] = 1.0
+        return X / size_factors[:, None]
+
+    def transform(self, X):
+        check_is_fitted(self, 'n_features_in_')
+        # One float32 copy, then transformed in place
+        X = np.array(X, dtype=np.float32)
+        if self.method == 'log1p':
+            np.log1p(X, out=X)
+        elif self.method == 'standardize':
+            X -= self.mean_
+            X /= self.scale_
+        else:
+            q = self._normalize(X).astype(np.float32, copy=False)
+            a = self.dispersion_
+            # DESeq2's closed form for a single dispersion: log2((1 + 2aq + 2 sqrt(aq (1 + aq))) / 4a)
+            X = ((2 * np.arcsinh(np.sqrt(a * q)) - np.log(4 * a)) / np.log(2)).astype(np.float32)
+        return X
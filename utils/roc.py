@@ -0,0 +1,181 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from joblib import Parallel, delayed
+from scipy.stats import norm, rankdata
+from sklearn.metrics import roc_curve
+
+
+def label_samples(samples):
+    """Labels TCGA barcodes with a -01 (primary tumour) sample type as cancer, the rest as normal"""
+    return ['cancer' if '-01' in sample else 'normal' for sample in samples]
+
+
+def batch_auc(X, y_bin):
+    """Scores every column of X in one pass using the Mann-Whitney U statistic"""
+    X = np.asarray(X, dtype=np.float64)
+    positive = np.asarray(y_bin).ravel() == 1
+    n_pos = positive.sum()
+    n_neg = positive.size - n_pos
+    # Average ranks give ties half credit, which matches the trapezoidal ROC area
+    ranks = rankdata(X, axis=0)
+    rank_sum = ranks[positive].sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (rank_sum - n_pos * (n_pos + 1) / 2.0) / (n_pos * n_neg)
+
+
+# Vertices kept per plotted ROC curve
+MAX_CURVE_POINTS = 200
+
+
+def simplify_curve(fpr, tpr, max_points=MAX_CURVE_POINTS):
+    """Keeps at most max_points vertices, spaced evenly along the curve's length and always both ends"""
+    if len(fpr) <= max_points:
+        return fpr, tpr
+    length = np.concatenate([[0.0], np.cumsum(np.hypot(np.diff(fpr), np.diff(tpr)))])
+    keep = np.unique(np.searchsorted(length, np.linspace(0.0, length[-1], max_points)))
+    keep[-1] = len(fpr) - 1
+    return fpr[keep], tpr[keep]
+
+
+# Confidence interval methods offered on the ROC page
+CI_METHODS = {
+    'Bootstrap (stratified)': 'bootstrap',
+    'DeLong': 'delong',
+}
+
+# Elements of the replicates x samples x genes block one bootstrap task works on
+BOOTSTRAP_BLOCK = 4_000_000
+
+
+def _bootstrap_chunk(X, positive, weights, start, stop):
+    """AUC of every bootstrap replicate for genes start:stop, as (replicates, genes)
+
+    A replicate is a row of sample multiplicities, so each gene is sorted once and every replicate's
+    Mann-Whitney U comes from cumulative sums of the negative weights below each positive; ties get half credit.
+    """
+    X = np.asarray(X[:, start:stop], dtype=np.float64).T
+    n = X.shape[1]
+    order = np.argsort(X, axis=1, kind="stable")
+    sorted_x = np.take_along_axis(X, order, axis=1)
+    is_positive = positive[order][:, :, None]
+
+    # genes x sorted samples x replicates, with replicates innermost for the running sums
+    sorted_weights = weights.T[order]
+    negative_weights = np.where(is_positive, 0, sorted_weights)
+    credit = np.cumsum(negative_weights, axis=1)
+    starts = np.ones(sorted_x.shape, dtype=bool)
+    starts[:, 1:] = sorted_x[:, 1:] != sorted_x[:, :-1]
+    if not starts.all():
+        # Within a run of tied values a positive is credited with every negative below it and half of those tied
+        ends = np.ones(sorted_x.shape, dtype=bool)
+        ends[:, :-1] = starts[:, 1:]
+        positions = np.arange(n)
+        first = np.maximum.accumulate(np.where(starts, positions, 0), axis=1)
+        last = np.minimum.accumulate(np.where(ends, positions, n - 1)[:, ::-1], axis=1)[:, ::-1]
+        below = np.take_along_axis(credit - negative_weights, first[:, :, None], axis=1)
+        credit = 0.5 * (below + np.take_along_axis(credit, last[:, :, None], axis=1))
+    n_positive = positive.sum()
+    u = (np.where(is_positive, sorted_weights, 0) * credit).sum(axis=1)
+    return u.T / (n_positive * (n - n_positive))
+
+
+def _delong_chunk(X, positive, start, stop, z):
+    """DeLong AUC intervals for genes start:stop from the batched placement values"""
+    X = np.asarray(X[:, start:stop], dtype=np.float64)
+    n_positive, n_negative = positive.sum(), (~positive).sum()
+    ranks = rankdata(X, axis=0)
+    positive_placements = (ranks[positive] - rankdata(X[positive], axis=0)) / n_negative
+    negative_placements = 1.0 - (ranks[~positive] - rankdata(X[~positive], axis=0)) / n_positive
+    auc = positive_placements.mean(axis=0)
+    variance = positive_placements.var(axis=0, ddof=1) / n_positive + negative_placements.var(axis=0, ddof=1) / n_negative
+    half_width = z * np.sqrt(variance)
+    return np.clip(auc - half_width, 0, 1), np.clip(auc + half_width, 0, 1)
+
+
+def auc_confidence_intervals(X, y_bin, method="bootstrap", n_bootstraps=1000, confidence=0.95, random_state=42,
+                             n_jobs=-1, progress=None):
+    """Lower and upper confidence bounds on every column's AUC, computed in gene blocks over a process pool
+
+    Bootstrap draws stratified resamples once, as sample multiplicities shared by every gene, and takes
+    percentile bounds. DeLong uses the normal approximation to the AUC's variance.
+    """
+    X = np.asarray(X)
+    positive = np.asarray(y_bin).ravel() == 1
+    n_genes = X.shape[1]
+    if method == "delong":
+        block = max(1, BOOTSTRAP_BLOCK // X.shape[0])
+        tasks = [delayed(_delong_chunk)(X, positive, start, min(start + block, n_genes), norm.ppf(0.5 + confidence / 2))
+                 for start in range(0, n_genes, block)]
+    else:
+        rng = np.random.default_rng(random_state)
+        weights = np.zeros((n_bootstraps, X.shape[0]), dtype=np.float32)
+        replicates = np.arange(n_bootstraps)[:, None]
+        for group in (np.flatnonzero(positive), np.flatnonzero(~positive)):
+            np.add.at(weights, (replicates, group[rng.integers(0, len(group), (n_bootstraps, len(group)))]), 1)
+        block = max(1, BOOTSTRAP_BLOCK // (n_bootstraps * X.shape[0]))
+        tasks = [delayed(_bootstrap_chunk)(X, positive, weights, start, min(start + block, n_genes))
+                 for start in range(0, n_genes, block)]
+
+    # The matrix and shared weights reach the workers as read-only memory maps
+    lower, upper = [], []
+    results = Parallel(n_jobs=n_jobs, max_nbytes="1M", mmap_mode="r", return_as="generator")(tasks)
+    for done, result in enumerate(results, start=1):
+        if method == "delong":
+            chunk_lower, chunk_upper = result
+        else:
+            chunk_lower, chunk_upper = np.quantile(result, [(1 - confidence) / 2, (1 + confidence) / 2], axis=0)
+        lower.append(chunk_lower)
+        upper.append(chunk_upper)
+        if progress is not None:
+            progress(done, len(tasks), f"Scored {min(done * block, n_genes)} of {n_genes} genes")
+    return np.concatenate(lower), np.concatenate(upper)
+
+
+def roc_curves(X, y_bin, columns, max_points=None):
+    """Builds fpr/tpr arrays only for the requested columns of X, simplified to max_points when given"""
+    X = np.asarray(X)
+    y_bin = np.asarray(y_bin).ravel()
+    fpr = dict()
+    tpr = dict()
+    for i in columns:
+        fpr[i], tpr[i], _ = roc_curve(y_bin, X[:, i].ravel())
+        if max_points is not None:
+            fpr[i], tpr[i] = simplify_curve(fpr[i], tpr[i], max_points)
+    return fpr, tpr
+
+
+def roc_figure(curves, roc_auc, gene_ids, auc_threshold, pinned=()):
+    """WebGL ROC plot of precomputed curves; genes at or below the threshold stay in the legend, hidden
+
+    curves maps a column to its (fpr, tpr). Pinned columns are shown whatever their AUC.
+    """
+    figure = go.Figure()
+    for i, (fpr, tpr) in curves.items():
+        figure.add_trace(go.Scattergl(
+            x=fpr, y=tpr, mode="lines", name=f"Gene {gene_ids[i]} (AUC = {roc_auc[i]:.4f})",
+            visible=True if roc_auc[i] > auc_threshold or i in pinned else "legendonly",
+        ))
+    figure.add_trace(go.Scattergl(x=[0, 1], y=[0, 1], mode="lines", line={"dash": "dash", "color": "black"},
+                                  showlegend=False, hoverinfo="skip"))
+    figure.update_layout(
+        title=f"ROC Curve for Genes with AUC > {auc_threshold}", xaxis_title="False Positive Rate",
+        yaxis_title="True Positive Rate", xaxis_range=[0.0, 1.0], yaxis_range=[0.0, 1.05], height=600,
+    )
+    return figure
+
+
+def positive_labels(samples):
+    """1 for cancer samples and 0 for normal ones; cancer is the positive class, so genes upregulated in
+    tumours score above 0.5"""
+    return (np.asarray(label_samples(samples)) == 'cancer').astype(int)
+
+
+def roc_table(genes_df):
+    """Scores every gene of a genes x samples frame and returns its Ensembl_ID/ROC table"""
+    X = np.asarray(genes_df.iloc[:, 1:].T)
+    y_bin = positive_labels(genes_df.columns[1:])
+    return pd.DataFrame({
+        'Ensembl_ID': genes_df.iloc[:, 0],
+        'ROC': batch_auc(X, y_bin)
+    })
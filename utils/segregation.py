@@ -0,0 +1,75 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+
+def seperateByRace(file, target, name, race):
+    """Separates Data by Race"""
+    racer = file[file["race.demographic"].str.contains(race, case=False, na=False)]
+    output_file_path = os.path.join(target, f"{name}.csv")
+    racer.to_csv(output_file_path, index=False)
+    return output_file_path
+
+
+def matchingDNA(race, counts, target, name):
+    """Matches Sample ID from phenotypes to counts"""
+    phenotypeData = pd.read_csv(race)
+    colA1 = phenotypeData.iloc[:, 0]
+    newFile = counts[['Ensembl_ID'] + [col for col in colA1 if col in counts.columns[1:]]]
+    output_file_path = os.path.join(target, f"{name}.csv")
+    newFile.to_csv(output_file_path, index=False)
+    return output_file_path
+
+
+def race_samples(phenotype, races):
+    """Maps each race to its sample IDs, matching like seperateByRace"""
+    # Only the few distinct demographic values are string-matched, not every row
+    codes, uniques = pd.factorize(phenotype["race.demographic"])
+    samples = phenotype.iloc[:, 0].to_numpy()
+    mapping = {}
+    for race in races:
+        # Trailing False catches code -1, which factorize gives to missing values
+        hits = np.array([isinstance(value, str) and race.lower() in value.lower() for value in uniques] + [False])
+        mapping[race] = samples[hits[codes]]
+    return mapping
+
+
+def partition_by_race(phenotype, counts, races):
+    """Splits counts into one matched frame per race in a single pass"""
+    id_position = counts.columns.get_loc("Ensembl_ID")
+    # One sample -> column position table shared by every race
+    positions = {col: i for i, col in enumerate(counts.columns) if i > 0}
+    partitions = {}
+    for race, samples in race_samples(phenotype, races).items():
+        columns = [positions[sample] for sample in samples if sample in positions]
+        partitions[race] = counts.iloc[:, [id_position] + columns]
+    return partitions
+
+
+def stream_partition_by_race(phenotype, counts_file, races, target, chunksize=2000):
+    """Writes per-race matched counts, parsing only the needed columns in row chunks"""
+    # The header alone is enough to resolve which sample columns exist
+    counts_file.seek(0)
+    header = pd.read_csv(counts_file, nrows=0).columns
+    counts_file.seek(0)
+    available = set(header[1:])
+    selected = {
+        race: [sample for sample in samples if sample in available]
+        for race, samples in race_samples(phenotype, races).items()
+    }
+    usecols = {"Ensembl_ID"}.union(*selected.values())
+
+    paths = {race: os.path.join(target, f"matched_{race}.csv") for race in selected}
+    handles = {race: open(path, "w", newline="") for race, path in paths.items()}
+    try:
+        for race, samples in selected.items():
+            pd.DataFrame(columns=["Ensembl_ID"] + samples).to_csv(handles[race], index=False)
+        # Peak memory is one chunk of the union of the selected columns
+        for chunk in pd.read_csv(counts_file, usecols=lambda col: col in usecols, chunksize=chunksize):
+            for race, samples in selected.items():
+                chunk[["Ensembl_ID"] + samples].to_csv(handles[race], header=False, index=False)
+    finally:
+        for handle in handles.values():
+            handle.close()
+    return paths
@@ -0,0 +1,642 @@
+import time
+from numbers import Integral
+
+import numpy as np
+from joblib import Parallel, delayed, effective_n_jobs
+from scipy.stats import rankdata
+from sklearn.base import clone
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import check_scoring
+from sklearn.metrics.pairwise import pairwise_kernels
+from sklearn.model_selection import GridSearchCV, ParameterGrid, check_cv
+from sklearn.svm import SVC
+from sklearn.utils._param_validation import Interval
+
+
+def _fold_data(X, y, folds, prepare=None):
+    """Each fold's (X_train, y_train, X_test, y_test), passed through prepare so that resampling and
+    transforms are fitted on the fold's training rows only"""
+    data = []
+    for train, test in folds:
+        X_train, y_train, X_test = X[train], y[train], X[test]
+        if prepare is not None:
+            X_train, y_train, X_test = prepare(X_train, y_train, X_test)
+        data.append((X_train, y_train, X_test, y[test]))
+    return data
+
+
+def _refit_best(search, X, y):
+    """Fits the best candidate on all of X, prepared the same way as the folds, when the search refits"""
+    if not search.refit:
+        return
+    if search.prepare is not None:
+        X, y, _ = search.prepare(X, y, X[:0])
+    search.best_estimator_ = clone(search.estimator).set_params(**search.best_params_).fit(X, y)
+    search.n_fits_ += 1
+
+
+class ProgressGridSearchCV(GridSearchCV):
+    """GridSearchCV that evaluates candidates in batches and reports progress after each batch"""
+
+    _parameter_constraints: dict = {
+        **GridSearchCV._parameter_constraints,
+        "progress": [callable, None],
+        "batch_size": [Interval(Integral, 1, None, closed="left"), None],
+    }
+
+    def __init__(
+        self,
+        estimator,
+        param_grid,
+        *,
+        scoring=None,
+        n_jobs=None,
+        refit=True,
+        cv=None,
+        verbose=0,
+        pre_dispatch="2*n_jobs",
+        error_score=float("nan"),
+        return_train_score=False,
+        progress=None,
+        batch_size=None,
+    ):
+        super().__init__(
+            estimator,
+            param_grid,
+            scoring=scoring,
+            n_jobs=n_jobs,
+            refit=refit,
+            cv=cv,
+            verbose=verbose,
+            pre_dispatch=pre_dispatch,
+            error_score=error_score,
+            return_train_score=return_train_score,
+        )
+        self.progress = progress
+        self.batch_size = batch_size
+
+    def _run_search(self, evaluate_candidates):
+        candidates = list(ParameterGrid(self.param_grid))
+        # Two candidates per worker keeps every core busy between progress updates
+        batch_size = self.batch_size or 2 * effective_n_jobs(self.n_jobs)
+        for start in range(0, len(candidates), batch_size):
+            evaluate_candidates(candidates[start:start + batch_size])
+            if self.progress is not None:
+                self.progress(min(start + batch_size, len(candidates)), len(candidates))
+
+
+# Parameters each SVC kernel actually depends on, with SVC's defaults
+KERNEL_PARAMS = {
+    "linear": {},
+    "rbf": {"gamma": "scale"},
+    "poly": {"gamma": "scale", "coef0": 0.0, "degree": 3},
+    "sigmoid": {"gamma": "scale", "coef0": 0.0},
+}
+
+
+def _resolve_gamma(gamma, X):
+    """Turns SVC's 'scale'/'auto' gamma into the number SVC would use for X"""
+    if gamma == "scale":
+        return 1.0 / (X.shape[1] * X.var()) if X.var() != 0 else 1.0
+    if gamma == "auto":
+        return 1.0 / X.shape[1]
+    return gamma
+
+
+def _kernel_spec_scores(X, y, folds, fold_data, kernel, kernel_params, candidates, scorer):
+    """Fits every candidate sharing one kernel against a single Gram matrix, sliced per fold"""
+    X = np.asarray(X, dtype=np.float64)
+    # String gammas depend on each fold's training data, and prepared folds hold rows X doesn't,
+    # so those kernels are built per fold
+    full = None
+    if fold_data is None and not isinstance(kernel_params.get("gamma"), str):
+        full = pairwise_kernels(X, metric=kernel, **kernel_params)
+
+    scores = np.full((len(candidates), len(folds)), np.nan)
+    for fold, (train, test) in enumerate(folds):
+        if full is not None:
+            K_train = full[np.ix_(train, train)]
+            K_test = full[np.ix_(test, train)]
+            y_train, y_test = y[train], y[test]
+        else:
+            X_train, y_train, X_test, y_test = fold_data[fold] if fold_data is not None else (
+                X[train], y[train], X[test], y[test]
+            )
+            params = dict(kernel_params)
+            if "gamma" in params:
+                params["gamma"] = _resolve_gamma(params["gamma"], np.asarray(X_train, dtype=np.float64))
+            K_train = pairwise_kernels(X_train, metric=kernel, **params)
+            K_test = pairwise_kernels(X_test, X_train, metric=kernel, **params)
+        for row, (_, svc_params) in enumerate(candidates):
+            try:
+                model = SVC(kernel="precomputed", **svc_params).fit(K_train, y_train)
+                scores[row, fold] = scorer(model, K_test, y_test)
+            except ValueError:
+                # Same as GridSearchCV's default error_score
+                pass
+    return [index for index, _ in candidates], scores
+
+
+class PrecomputedKernelSearchCV:
+    """Grid search for SVC that computes each distinct kernel matrix once and reuses it across C and class_weight"""
+
+    def __init__(self, estimator, param_grid, *, scoring="accuracy", n_jobs=None, cv=5, verbose=0, refit=True,
+                 prepare=None, progress=None):
+        self.estimator = estimator
+        self.param_grid = param_grid
+        self.scoring = scoring
+        self.n_jobs = n_jobs
+        self.cv = cv
+        self.verbose = verbose
+        self.refit = refit
+        self.prepare = prepare
+        self.progress = progress
+
+    def _group_candidates(self, candidates):
+        """Groups candidate indices by the kernel matrix they need"""
+        groups = {}
+        for index, params in enumerate(candidates):
+            params = {**self.estimator.get_params(), **params}
+            kernel = params["kernel"]
+            kernel_params = {name: params[name] for name in KERNEL_PARAMS[kernel]}
+            # probability only adds Platt scaling, which predict-based scoring never uses
+            svc_params = {
+                name: value for name, value in params.items()
+                if name not in ("kernel", "gamma", "coef0", "degree", "probability")
+            }
+            key = (kernel, tuple(sorted(kernel_params.items())))
+            groups.setdefault(key, []).append((index, svc_params))
+        return groups
+
+    def fit(self, X, y):
+        X = np.asarray(X)
+        y = np.asarray(y)
+        candidates = list(ParameterGrid(self.param_grid))
+        folds = list(check_cv(self.cv, y, classifier=True).split(X, y))
+        scorer = check_scoring(self.estimator, scoring=self.scoring)
+        groups = self._group_candidates(candidates)
+        fold_data = _fold_data(X, y, folds, self.prepare) if self.prepare is not None else None
+
+        scores = np.full((len(candidates), len(folds)), np.nan)
+        done = 0
+        tasks = Parallel(n_jobs=self.n_jobs, verbose=self.verbose, return_as="generator_unordered")(
+            delayed(_kernel_spec_scores)(X, y, folds, fold_data, kernel, dict(kernel_params), group, scorer)
+            for (kernel, kernel_params), group in groups.items()
+        )
+        for indices, group_scores in tasks:
+            scores[indices] = group_scores
+            done += len(indices)
+            if self.progress is not None:
+                self.progress(done, len(candidates))
+
+        mean = scores.mean(axis=1)
+        # Same ranking as GridSearchCV: failed candidates rank last, ties share the best rank
+        rank = rankdata(-np.nan_to_num(mean, nan=-np.inf), method="min").astype(np.int32)
+        self.cv_results_ = {
+            "params": candidates,
+            **{f"param_{name}": np.ma.masked_array([params.get(name) for params in candidates], dtype=object)
+               for name in {name for params in candidates for name in params}},
+            **{f"split{fold}_test_score": scores[:, fold] for fold in range(len(folds))},
+            "mean_test_score": mean,
+            "std_test_score": scores.std(axis=1),
+            "rank_test_score": rank,
+        }
+        self.n_splits_ = len(folds)
+        self.n_fits_ = len(candidates) * len(folds)
+        self.best_index_ = int(rank.argmin())
+        self.best_score_ = mean[self.best_index_]
+        self.best_params_ = candidates[self.best_index_]
+        _refit_best(self, X, y)
+        return self
+
+
+def _smoothed_predictions(X, theta, var, log_prior, epsilons):
+    """Predicts class indices for X under every smoothing value at once, as GaussianNB would"""
+    # Squared deviations don't depend on the smoothing, so they are computed once per class
+    jll = np.empty((len(epsilons), X.shape[0], len(theta)))
+    for c in range(len(theta)):
+        smoothed = var[c][None, :] + epsilons[:, None]
+        sq_dev = (X - theta[c]) ** 2
+        jll[:, :, c] = (
+            log_prior[c]
+            - 0.5 * np.log(2.0 * np.pi * smoothed).sum(axis=1)[:, None]
+            - 0.5 * (sq_dev @ (1.0 / smoothed).T).T
+        )
+    return jll.argmax(axis=2)
+
+
+class VarSmoothingSearchCV:
+    """Tunes GaussianNB's var_smoothing from per-fold class statistics without refitting for each value"""
+
+    def __init__(self, estimator, param_grid, *, scoring="accuracy", n_jobs=None, cv=5, verbose=0,
+                 return_train_score=False, refit=True, prepare=None, progress=None):
+        self.estimator = estimator
+        self.param_grid = param_grid
+        self.scoring = scoring
+        self.n_jobs = n_jobs
+        self.cv = cv
+        self.verbose = verbose
+        self.return_train_score = return_train_score
+        self.refit = refit
+        self.prepare = prepare
+        self.progress = progress
+
+    def fit(self, X, y):
+        if set(self.param_grid) != {"var_smoothing"} or self.scoring != "accuracy":
+            raise ValueError("VarSmoothingSearchCV only tunes var_smoothing for accuracy")
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y)
+        smoothing = np.asarray(self.param_grid["var_smoothing"], dtype=np.float64)
+        folds = list(check_cv(self.cv, y, classifier=True).split(X, y))
+
+        test_scores = np.empty((len(smoothing), len(folds)))
+        train_scores = np.empty((len(smoothing), len(folds)))
+        for fold, (X_train, y_train_labels, X_test, y_test) in enumerate(_fold_data(X, y, folds, self.prepare)):
+            # Sufficient statistics, shared by every smoothing value
+            classes, y_train = np.unique(y_train_labels, return_inverse=True)
+            X_train = np.asarray(X_train, dtype=np.float64)
+            X_test = np.asarray(X_test, dtype=np.float64)
+            theta = np.array([X_train[y_train == c].mean(axis=0) for c in range(len(classes))])
+            var = np.array([X_train[y_train == c].var(axis=0) for c in range(len(classes))])
+            log_prior = np.log(np.bincount(y_train) / len(y_train))
+            epsilons = smoothing * X_train.var(axis=0).max()
+
+            predicted = classes[_smoothed_predictions(X_test, theta, var, log_prior, epsilons)]
+            test_scores[:, fold] = (predicted == y_test).mean(axis=1)
+            if self.return_train_score:
+                predicted = classes[_smoothed_predictions(X_train, theta, var, log_prior, epsilons)]
+                train_scores[:, fold] = (predicted == y_train_labels).mean(axis=1)
+            if self.progress is not None:
+                self.progress(len(smoothing) * (fold + 1) // len(folds), len(smoothing))
+
+        candidates = [{"var_smoothing": value} for value in self.param_grid["var_smoothing"]]
+        mean = test_scores.mean(axis=1)
+        rank = rankdata(-mean, method="min").astype(np.int32)
+        self.cv_results_ = {
+            "params": candidates,
+            "param_var_smoothing": np.ma.masked_array(list(self.param_grid["var_smoothing"]), dtype=object),
+            **{f"split{fold}_test_score": test_scores[:, fold] for fold in range(len(folds))},
+            "mean_test_score": mean,
+            "std_test_score": test_scores.std(axis=1),
+            "rank_test_score": rank,
+        }
+        if self.return_train_score:
+            self.cv_results_.update({
+                **{f"split{fold}_train_score": train_scores[:, fold] for fold in range(len(folds))},
+                "mean_train_score": train_scores.mean(axis=1),
+                "std_train_score": train_scores.std(axis=1),
+            })
+        self.n_splits_ = len(folds)
+        # One pass of class statistics per fold stands in for fitting every candidate
+        self.n_fits_ = len(folds)
+        self.best_index_ = int(rank.argmin())
+        self.best_score_ = mean[self.best_index_]
+        self.best_params_ = candidates[self.best_index_]
+        _refit_best(self, X, y)
+        return self
+
+
+def _fit_step(model, X_train, y_train, X_test, y_test, C, scorer):
+    """Refits a fold's model at the next C, starting from its current coefficients"""
+    start = time.perf_counter()
+    try:
+        model.set_params(C=C).fit(X_train, y_train)
+        score = scorer(model, X_test, y_test)
+    except ValueError:
+        # Same as GridSearchCV's default error_score
+        score = np.nan
+    return model, score, time.perf_counter() - start
+
+
+class WarmStartPathSearchCV:
+    """Grid search for LogisticRegression that walks C warm-started and drops candidates that can no longer win
+
+    Warm-started saga fits stop at slightly different solutions than cold ones, so scores can differ a little from
+    GridSearchCV's. Pruning is exact for this search's own scores: a dropped candidate could not have won, but its
+    mean_test_score covers only the folds it was scored on, and it ranks after every finished candidate.
+    Only accuracy is supported, as the pruning bound relies on a best possible score of 1.0.
+    """
+
+    def __init__(self, estimator, param_grid, *, scoring="accuracy", n_jobs=None, cv=5, verbose=0, refit=True,
+                 prepare=None, progress=None):
+        self.estimator = estimator
+        self.param_grid = param_grid
+        self.scoring = scoring
+        self.n_jobs = n_jobs
+        self.cv = cv
+        self.verbose = verbose
+        self.refit = refit
+        self.prepare = prepare
+        self.progress = progress
+
+    def fit(self, X, y):
+        if self.scoring != "accuracy":
+            raise ValueError("WarmStartPathSearchCV only prunes for accuracy, whose best possible score is 1.0")
+        start = time.perf_counter()
+        X = np.asarray(X)
+        y = np.asarray(y)
+        candidates = list(ParameterGrid(self.param_grid))
+        folds = list(check_cv(self.cv, y, classifier=True).split(X, y))
+        fold_data = _fold_data(X, y, folds, self.prepare)
+        scorer = check_scoring(self.estimator, scoring=self.scoring)
+        best_possible = 1.0
+
+        # Every setting other than C is one path; each (path, fold) keeps a model that is refitted at increasing C
+        paths, levels = {}, {}
+        for index, params in enumerate(candidates):
+            path_params = {**self.estimator.get_params(), **params, "warm_start": True}
+            C = path_params.pop("C")
+            path = tuple(sorted(path_params.items(), key=lambda item: item[0]))
+            if path not in paths:
+                paths[path] = [LogisticRegression(**path_params) for _ in folds]
+            levels.setdefault(C, []).append((index, path))
+
+        scores = np.full((len(candidates), len(folds)), np.nan)
+        fit_times = np.zeros((len(candidates), len(folds)))
+        alive = np.ones(len(candidates), dtype=bool)
+        scored = np.zeros(len(candidates), dtype=int)
+        self.n_fits_ = 0
+        with Parallel(n_jobs=self.n_jobs, verbose=self.verbose) as parallel:
+            # Strong regularisation first: those fits are cheap and set the bar the expensive ones must reach
+            for C in sorted(levels):
+                for fold, data in enumerate(fold_data):
+                    members = [(index, path) for index, path in levels[C] if alive[index]]
+                    results = parallel(
+                        delayed(_fit_step)(paths[path][fold], *data, C, scorer) for _, path in members
+                    )
+                    for (index, path), (model, score, seconds) in zip(members, results):
+                        paths[path][fold] = model
+                        scores[index, fold] = score
+                        fit_times[index, fold] = seconds
+                        scored[index] += 1
+                    self.n_fits_ += len(members)
+
+                    # A candidate is dropped once even perfect scores on its remaining folds can't reach
+                    # the mean another candidate is already guaranteed
+                    observed = np.nan_to_num(scores, nan=0.0).sum(axis=1)
+                    guaranteed = np.where(alive, observed, -np.inf).max()
+                    hopeless = observed + (len(folds) - scored) * best_possible < guaranteed - 1e-12
+                    alive &= ~hopeless | (scored == len(folds))
+                    if self.progress is not None:
+                        self.progress(int(((scored == len(folds)) | ~alive).sum()), len(candidates))
+
+        # Pruned candidates keep the mean of the folds they were scored on and rank after every finished one
+        mean = np.nanmean(scores, axis=1)
+        rank = np.empty(len(candidates), dtype=np.int32)
+        for group, offset in ((alive, 0), (~alive, alive.sum())):
+            rank[group] = offset + rankdata(-np.nan_to_num(mean[group], nan=-np.inf), method="min")
+        self.cv_results_ = {
+            "params": candidates,
+            **{f"param_{name}": np.ma.masked_array([params.get(name) for params in candidates], dtype=object)
+               for name in {name for params in candidates for name in params}},
+            **{f"split{fold}_test_score": scores[:, fold] for fold in range(len(folds))},
+            "mean_test_score": mean,
+            "std_test_score": np.nanstd(scores, axis=1),
+            "rank_test_score": rank,
+            "mean_fit_time": fit_times.sum(axis=1) / np.maximum(scored, 1),
+            "pruned": ~alive,
+        }
+        self.n_pruned_fits_ = len(candidates) * len(folds) - self.n_fits_
+        self.n_splits_ = len(folds)
+        self.best_index_ = int(rank.argmin())
+        self.best_score_ = mean[self.best_index_]
+        self.best_params_ = candidates[self.best_index_]
+        _refit_best(self, X, y)
+        self.fit_time_ = time.perf_counter() - start
+        return self
+
+
+def _fold_score(estimator, params, X_train, y_train, X_test, y_test, scorer):
+    """Fits one candidate on one fold's training rows and scores it on the fold's test rows"""
+    start = time.perf_counter()
+    try:
+        model = clone(estimator).set_params(**params).fit(X_train, y_train)
+        score = scorer(model, X_test, y_test)
+    except ValueError:
+        # Same as GridSearchCV's default error_score
+        score = np.nan
+    return score, time.perf_counter() - start
+
+
+def _stratified_subsample(train, y, n_samples, rng, min_per_class=1):
+    """Takes n_samples of the training rows, keeping each class's share but at least min_per_class rows of each"""
+    if n_samples >= len(train):
+        return train
+    classes, counts = np.unique(y[train], return_counts=True)
+    take = np.maximum(np.round(counts * n_samples / len(train)).astype(int), min_per_class)
+    return np.sort(np.concatenate([
+        rng.choice(train[y[train] == c], size=min(n, count), replace=False)
+        for c, n, count in zip(classes, take, counts)
+    ]))
+
+
+def _candidate_features(candidates):
+    """Encodes candidates for the surrogate: ordered values by their position, anything else as a category"""
+    names = sorted({name for params in candidates for name in params})
+    columns = []
+    for name in names:
+        values = [params.get(name) for params in candidates]
+        numeric = all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in values)
+        distinct = sorted(set(values)) if numeric else list(dict.fromkeys(map(repr, values)))
+        position = {value: i for i, value in enumerate(distinct)}
+        codes = np.array([position[value if numeric else repr(value)] for value in values], dtype=np.float64)
+        columns.append((codes / max(len(distinct) - 1, 1), numeric))
+    return columns
+
+
+class BudgetedSearchCV:
+    """Hyperparameter search over a grid under a fit and wall-clock budget
+
+    strategy is one of:
+    - "halving_samples": successive halving, growing the training rows each round
+    - "halving_folds": successive halving, adding CV folds each round
+    - "random": n_candidates sampled from the grid
+    - "bayesian": n_candidates picked in batches, each steered towards settings near the best scores so far
+    Once time_budget seconds have passed no new fits start, and the best candidate from the furthest
+    completed round is kept. min_class_samples keeps enough rows of every class in subsampled rounds for
+    prepare's resampler to find its neighbours.
+    """
+
+    def __init__(self, estimator, param_grid, *, strategy="halving_samples", n_candidates=None, time_budget=None,
+                 factor=3, scoring="accuracy", n_jobs=None, cv=5, verbose=0, random_state=None, cv_params=None,
+                 refit=True, prepare=None, progress=None, min_class_samples=1):
+        self.estimator = estimator
+        self.param_grid = param_grid
+        self.strategy = strategy
+        self.n_candidates = n_candidates
+        self.time_budget = time_budget
+        self.factor = factor
+        self.scoring = scoring
+        self.n_jobs = n_jobs
+        self.cv = cv
+        self.verbose = verbose
+        self.random_state = random_state
+        self.cv_params = cv_params
+        self.refit = refit
+        self.prepare = prepare
+        self.progress = progress
+        self.min_class_samples = min_class_samples
+
+    def _run_round(self, parallel, tasks, scores):
+        """Scores (candidate, fold, fold data) tasks into scores; returns False if time ran out first"""
+        batch_size = 2 * effective_n_jobs(self.n_jobs)
+        for start in range(0, len(tasks), batch_size):
+            # The first round always finishes so there is a model to return
+            if self._iter.max() >= 0 and time.perf_counter() > self._deadline:
+                self.timed_out_ = True
+                return False
+            batch = tasks[start:start + batch_size]
+            results = parallel(
+                delayed(_fold_score)(
+                    self.estimator, {**self._candidates[index], **(self.cv_params or {})}, *data, self._scorer
+                )
+                for index, fold, data in batch
+            )
+            for (index, fold, _), (score, seconds) in zip(batch, results):
+                scores[index, fold] = score
+                self._fit_times[index, fold] += seconds
+            self.n_fits_ += len(batch)
+        return True
+
+    def _commit(self, indices, scores, round_, resource):
+        self._scores[indices] = scores[indices]
+        self._iter[indices] = round_
+        self._n_resources[indices] = resource
+
+    def _report(self, settled):
+        if self.progress is not None:
+            self.progress(int(settled), len(self._candidates))
+
+    def _halving(self, parallel, pool, by_folds, rng):
+        n_folds = len(self._folds)
+        n_train = min(len(train) for train, _ in self._folds)
+        max_rounds = int(np.ceil(np.log(len(pool)) / np.log(self.factor))) + 1
+        if by_folds:
+            resources = np.unique(np.ceil(np.geomspace(1, n_folds, min(n_folds, max_rounds))).astype(int))
+        else:
+            min_samples = min(n_train, 2 * len(np.unique(self._y)) * n_folds)
+            n_rounds = max(1, min(int(np.log(n_train / min_samples) / np.log(self.factor)) + 1, max_rounds))
+            resources = [int(n_train / self.factor ** (n_rounds - 1 - k)) for k in range(n_rounds)]
+
+        alive = list(pool)
+        for round_, resource in enumerate(resources):
+            if by_folds:
+                # Scores from earlier folds carry over; only the newly added folds are fitted
+                previous = resources[round_ - 1] if round_ else 0
+                scores = self._scores.copy()
+                tasks = [(index, fold, self._fold_data[fold]) for index in alive for fold in range(previous, resource)]
+            else:
+                # Earlier rounds saw fewer rows, so every fold is rescored on the larger sample
+                scores = np.full_like(self._scores, np.nan)
+                subsampled = []
+                for train, test in self._folds:
+                    train = _stratified_subsample(train, self._y, resource, rng, self.min_class_samples)
+                    try:
+                        subsampled.extend(_fold_data(self._X, self._y, [(train, test)], self.prepare))
+                    except (ValueError, RuntimeError):
+                        # A resampler that still can't run on this few rows leaves the fold unscored this round
+                        subsampled.append(None)
+                tasks = [
+                    (index, fold, data) for index in alive for fold, data in enumerate(subsampled) if data is not None
+                ]
+            if not self._run_round(parallel, tasks, scores):
+                return
+            self._commit(alive, scores, round_, resource)
+            if round_ < len(resources) - 1:
+                means = np.nan_to_num(np.nanmean(scores[alive], axis=1), nan=-np.inf)
+                keep = max(1, int(np.ceil(len(alive) / self.factor)))
+                alive = [alive[i] for i in np.argsort(-means, kind="stable")[:keep]]
+                self._report(len(pool) - len(alive))
+        self._report(len(pool))
+
+    def _sampled(self, parallel, budget, adaptive, rng):
+        batch_size = effective_n_jobs(self.n_jobs)
+        remaining = list(rng.permutation(len(self._candidates)))
+        features = _candidate_features(self._candidates) if adaptive else None
+        evaluated = []
+        while len(evaluated) < budget:
+            # Adaptive sampling starts from a random quarter of the budget, then follows the surrogate
+            if adaptive and len(evaluated) >= max(batch_size, budget // 4):
+                remaining = self._acquire(features, evaluated, remaining)
+            chosen = remaining[:min(batch_size, budget - len(evaluated))]
+            remaining = remaining[len(chosen):]
+            scores = np.full_like(self._scores, np.nan)
+            tasks = [(index, fold, data) for index in chosen for fold, data in enumerate(self._fold_data)]
+            if not self._run_round(parallel, tasks, scores):
+                return
+            self._commit(chosen, scores, 0, len(self._folds))
+            evaluated.extend(chosen)
+            self._report(len(evaluated) * len(self._candidates) // budget)
+
+    def _acquire(self, features, evaluated, remaining):
+        """Orders unevaluated candidates by a kernel-weighted score estimate plus an exploration bonus"""
+        means = np.nan_to_num(np.nanmean(self._scores[evaluated], axis=1), nan=0.0)
+        distance = np.zeros((len(remaining), len(evaluated)))
+        for codes, numeric in features:
+            diff = codes[remaining][:, None] - codes[evaluated][None, :]
+            distance += np.abs(diff) if numeric else (diff != 0)
+        weights = np.exp(-distance)
+        estimate = (weights @ means + means.mean()) / (weights.sum(axis=1) + 1)
+        bonus = (means.std() + 1e-3) / np.sqrt(1 + weights.sum(axis=1))
+        return [remaining[i] for i in np.argsort(-(estimate + bonus), kind="stable")]
+
+    def fit(self, X, y):
+        start = time.perf_counter()
+        self._X = np.asarray(X)
+        self._y = np.asarray(y)
+        self._candidates = candidates = list(ParameterGrid(self.param_grid))
+        self._folds = folds = list(check_cv(self.cv, self._y, classifier=True).split(self._X, self._y))
+        # Subsampling halving prepares its own smaller folds each round
+        self._fold_data = None
+        if self.strategy != "halving_samples":
+            self._fold_data = _fold_data(self._X, self._y, folds, self.prepare)
+        self._scorer = check_scoring(self.estimator, scoring=self.scoring)
+        self._deadline = start + self.time_budget if self.time_budget else np.inf
+        self._scores = np.full((len(candidates), len(folds)), np.nan)
+        self._fit_times = np.zeros((len(candidates), len(folds)))
+        # Last round each candidate completed (-1 if none), and the training rows or folds it had then
+        self._iter = np.full(len(candidates), -1)
+        self._n_resources = np.zeros(len(candidates), dtype=int)
+        self.n_fits_ = 0
+        self.timed_out_ = False
+
+        rng = np.random.default_rng(self.random_state)
+        budget = min(self.n_candidates or len(candidates), len(candidates))
+        with Parallel(n_jobs=self.n_jobs, verbose=self.verbose) as parallel:
+            if self.strategy in ("halving_samples", "halving_folds"):
+                pool = rng.choice(len(candidates), size=budget, replace=False)
+                self._halving(parallel, pool, self.strategy == "halving_folds", rng)
+            elif self.strategy in ("random", "bayesian"):
+                self._sampled(parallel, budget, self.strategy == "bayesian", rng)
+            else:
+                raise ValueError(f"Unknown search strategy {self.strategy!r}")
+
+        # Candidates that got further rank first, then by mean score
+        evaluated = self._iter >= 0
+        mean = np.full(len(candidates), np.nan)
+        std = np.full(len(candidates), np.nan)
+        mean[evaluated] = np.nanmean(self._scores[evaluated], axis=1)
+        std[evaluated] = np.nanstd(self._scores[evaluated], axis=1)
+        order = np.lexsort((-np.nan_to_num(mean, nan=-np.inf), -self._iter))
+        rank = np.empty(len(candidates), dtype=np.int32)
+        rank[order] = np.arange(1, len(candidates) + 1)
+        self.cv_results_ = {
+            "params": candidates,
+            **{f"param_{name}": np.ma.masked_array([params.get(name) for params in candidates], dtype=object)
+               for name in {name for params in candidates for name in params}},
+            **{f"split{fold}_test_score": self._scores[:, fold] for fold in range(len(folds))},
+            "mean_test_score": mean,
+            "std_test_score": std,
+            "rank_test_score": rank,
+            "mean_fit_time": self._fit_times.sum(axis=1) / len(folds),
+            "iter": self._iter,
+            "n_resources": self._n_resources,
+        }
+        self.n_splits_ = len(folds)
+        self.best_index_ = int(order[0])
+        self.best_score_ = mean[self.best_index_]
+        self.best_params_ = candidates[self.best_index_]
+        _refit_best(self, self._X, self._y)
+        self.fit_time_ = time.perf_counter() - start
+        del self._X, self._y, self._fold_data
+        return self
@@ -0,0 +1,66 @@
+import os
+import shutil
+import time
+import uuid
+
+import streamlit as st
+
+from utils.cache import CACHE_ROOT, DiskCache
+
+SESSIONS_DIR = "sessions"
+SESSION_QUOTA_BYTES = 2 * 1024 ** 3
+SESSION_TTL_SECONDS = 6 * 60 * 60
+
+_last_sweep = 0.0
+
+
+class WorkspaceQuotaError(RuntimeError):
+    """Raised when a session's outputs alone exceed its disk quota"""
+
+
+class Workspace(DiskCache):
+    """Private output directory for one Streamlit session"""
+
+    def __init__(self, workspace_id, quota_bytes=SESSION_QUOTA_BYTES):
+        super().__init__(os.path.join(SESSIONS_DIR, workspace_id), quota_bytes)
+        # The directory mtime is the session's last-seen time for the TTL sweep
+        os.utime(self.directory)
+
+    def claim(self, paths):
+        """Evicts this session's older files to make room for paths, enforcing the quota"""
+        paths = set(paths)
+        self.evict(keep=paths)
+        used = sum(entry.stat().st_size for entry in os.scandir(self.directory) if entry.is_file())
+        if used > self.max_bytes:
+            for path in paths:
+                if os.path.exists(path):
+                    os.remove(path)
+            raise WorkspaceQuotaError(
+                f"Outputs need {used / 1024 ** 2:.0f} MB, over the {self.max_bytes / 1024 ** 2:.0f} MB session quota"
+            )
+        return paths
+
+
+def sweep_workspaces(ttl_seconds=SESSION_TTL_SECONDS):
+    """Deletes session directories that have been idle for longer than ttl_seconds"""
+    root = os.path.join(CACHE_ROOT, SESSIONS_DIR)
+    if not os.path.isdir(root):
+        return
+    cutoff = time.time() - ttl_seconds
+    for entry in os.scandir(root):
+        if entry.is_dir() and entry.stat().st_mtime < cutoff:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def session_id():
+    """Returns a stable id for the current browser session"""
+    return st.session_state.setdefault("workspace_id", uuid.uuid4().hex)
+
+
+def get_workspace():
+    """Returns the current session's workspace, sweeping stale ones at most once a minute"""
+    global _last_sweep
+    if time.time() - _last_sweep > 60:
+        _last_sweep = time.time()
+        sweep_workspaces()
+    return Workspace(session_id())